@@ -1,10 +1,106 @@
+import logging
+
 import pandas as pd
 
+from dataset import load_dataset
+from model import build_model, get_model_file, load_model, model_checksum, save_model
+
+
+logger = logging.getLogger(__name__)
+
 
 class EligibilityPrediction:
-    def __init__(self, datafile: str):
-        # should be use in read only
-        self.dataframe = pd.read_excel(datafile)
+    def __init__(self, model: dict):
+        # The model (see `model.py`) holds frequency tables, so that the
+        # prediction only does lookups instead of scanning the whole dataframe.
+        self.model = model
+        # Version of the dataset, which changes with the model
+        self.version = model_checksum(model)[:16]
+
+        self.eligible_count = model["eligible_count"]
+        self.total_count = model["total_count"]
+        self.genre_counts = self._count_table(model, "Genre")
+        self.profession_counts = self._count_table(model, "Profession")
+        self.age_counts = self._count_table(model, "Age")
+        self.health_conditions = set(self.get_health_conditions())
+
+        # Ratio of each value, used by the batch prediction
+        self.genre_ratios = self._ratio_series(self.genre_counts)
+        self.profession_ratios = self._ratio_series(self.profession_counts)
+        self.age_ratios = self._ratio_series(self.age_counts)
+
+    @classmethod
+    def from_dataset(cls, datafile: str | pd.DataFrame) -> "EligibilityPrediction":
+        """
+        Builds the model from the preprocessed dataset (or its dataframe).
+        """
+        if isinstance(datafile, pd.DataFrame):
+            dataframe = datafile
+        else:
+            dataframe = load_dataset(datafile)
+
+        return cls(build_model(dataframe))
+
+    @classmethod
+    def load(cls, dataset_file) -> "EligibilityPrediction":
+        """
+        Loads the model saved next to the preprocessed dataset, without the
+        dataset. If missing (or outdated, or saved from another dataset file),
+        the model is built from the dataset and saved for the next starts.
+        """
+        model_file = get_model_file(dataset_file)
+        model = load_model(model_file, dataset_file) if model_file.exists() else None
+
+        if model is None:
+            logger.info(f"Building of the model from {dataset_file}...")
+            model = build_model(load_dataset(dataset_file))
+            try:
+                save_model(model, dataset_file)
+            except OSError as err:
+                logger.warning(f"Unable to save the model: {err}")
+
+        return cls(model)
+
+    @staticmethod
+    def _count_table(model: dict, column: str) -> dict:
+        """
+        Returns the (eligible count, total count) of each value of the column.
+        """
+        return {
+            value: (eligible_count, count)
+            for value, eligible_count, count in model["counts"][column]
+        }
+
+    @staticmethod
+    def _ratio(count_table: dict, value) -> float:
+        eligible_count, total_count = count_table.get(value, (0, 0))
+
+        return (eligible_count or 1) / (total_count or 1)
+
+    @classmethod
+    def _ratio_series(cls, count_table: dict) -> pd.Series:
+        return pd.Series(
+            [cls._ratio(count_table, value) for value in count_table],
+            index=list(count_table),
+            dtype=float,
+        )
+
+    def check_health_conditions(
+        self, health_conditions: list[str]
+    ) -> tuple[bool, list[str]]:
+        """
+        Returns whether one of the health conditions is known (and so makes
+        the person not eligible), and the unknown ones, in the given order.
+        """
+        requested = set(health_conditions)
+        # NB: A single set operation, whatever the number of conditions
+        unknown = requested - self.health_conditions
+        if not unknown:
+            return bool(requested), []
+
+        return len(unknown) < len(requested), [
+            x for x in dict.fromkeys(health_conditions) if x in unknown
+        ]
 
     def predict(
         self,
@@ -18,62 +114,119 @@ class EligibilityPrediction:
 
         Note that p=1 if eligible.
         """
+        return self.predict_details(health_conditions, genre, professions, age)[0]
 
-        eligible = self.dataframe[self.dataframe["Eligible"]]
+    def predict_details(
+        self,
+        health_conditions: list[str] = [],
+        genre: str | None = None,
+        professions: list[str] = [],
+        age: int | None = None,
+    ) -> tuple[float, list[str]]:
+        """
+        Returns the probability that a person is eligible for donation (see
+        `predict`), with the unknown health conditions, which are ignored.
+        """
+        excluded, unknown = False, []
+        if health_conditions:
+            excluded, unknown = self.check_health_conditions(health_conditions)
 
         # If no criteria, we predict globally
         if not (health_conditions or genre or professions or age):
-            prop = eligible["Eligible"].count() / self.dataframe["Eligible"].count()
+            prop = self.eligible_count / self.total_count
 
-            return prop
+            return prop, unknown
 
         # We start by assumpt that the person is eligible
         prop = 1
 
         # p(1/genre)
         if genre:
-            eprop_genre = eligible[eligible[["Genre"]] == genre]["Genre"].count() or 1
-            prop_genre = (
-                self.dataframe[self.dataframe[["Genre"]] == genre]["Genre"].count() or 1
-            )
-            prop *= eprop_genre / prop_genre
+            prop *= self._ratio(self.genre_counts, genre)
 
         # p(1/profession)
         for profession in professions:
-            eprop_profession = (
-                eligible[eligible["Profession"] == profession]["Profession"].count()
-                or 1
-            )
-            prop_profession = (
-                self.dataframe[self.dataframe["Profession"] == profession][
-                    "Profession"
-                ].count()
-                or 1
-            )
-            prop *= eprop_profession / prop_profession
+            prop *= self._ratio(self.profession_counts, profession)
 
         # p(1/age)
         if age:
-            eprop_age = eligible[eligible["Age"] == age]["Age"].count() or 1
-            prop_age = self.dataframe[self.dataframe["Age"] == age]["Age"].count() or 1
-            prop *= eprop_age / prop_age
+            prop *= self._ratio(self.age_counts, age)
 
         # p(1/health_condition) = 0
-        for health_condition in health_conditions:
-            if (self.get_health_conditions() == health_condition).any():
-                prop *= 0
+        if excluded:
+            prop *= 0
 
-        return prop
+        return prop, unknown
 
-    def get_health_conditions(self):
-        start_column = self.dataframe.columns.get_loc("ÉLIGIBILITÉ AU DON.")
-        end_column = self.dataframe.columns.get_loc("Si autres raison préciser")
-        data = self.dataframe.columns[start_column + 1 : end_column]
+    def predict_batch(self, inputs: list[dict]) -> list[float]:
+        """
+        Returns the probability of each input, in the same order.
+
+        Each input is a dict of the `predict` keyword arguments. The whole
+        batch is scored in a single vectorized pass.
+        """
+        return self.predict_batch_details(inputs)[0]
 
-        return data
+    def predict_batch_details(
+        self, inputs: list[dict]
+    ) -> tuple[list[float], list[list[str]]]:
+        """
+        Returns the probability of each input (see `predict_batch`), with its
+        unknown health conditions, like `predict_details`.
+        """
+        if not inputs:
+            return [], []
+
+        frame = pd.DataFrame.from_records(
+            inputs, columns=["health_conditions", "genre", "professions", "age"]
+        )
+        genres = frame["genre"].where(frame["genre"] != "")
+        professions = frame["professions"].explode()
+        ages = pd.to_numeric(frame["age"], errors="coerce")
+        ages = ages.where(ages != 0)
+        health_conditions = frame["health_conditions"].explode()
+
+        # The factors of each input, in the same order as in predict, so
+        # that the products are exactly the same.
+        factors = pd.concat(
+            [
+                genres.map(self.genre_ratios).where(genres.notna(), 1.0),
+                professions.map(self.profession_ratios).where(professions.notna(), 1.0),
+                ages.map(self.age_ratios).where(ages.notna(), 1.0),
+            ]
+        ).fillna(1.0)
+        props = factors.sort_index(kind="stable").groupby(level=0).prod()
+
+        # p(1/health_condition) = 0
+        known = health_conditions.isin(self.health_conditions)
+        props[known.groupby(level=0).any()] = 0
+
+        # If no criteria, we predict globally
+        has_criteria = (
+            genres.notna()
+            | professions.notna().groupby(level=0).any()
+            | ages.notna()
+            | health_conditions.notna().groupby(level=0).any()
+        )
+        props = props.where(has_criteria, self.eligible_count / self.total_count)
+
+        # The unknown health conditions of each input, once, in the given order
+        unknown = [[] for _ in inputs]
+        for i, conditions in (
+            health_conditions[health_conditions.notna() & ~known]
+            .groupby(level=0, sort=False)
+            .agg(list)
+            .items()
+        ):
+            unknown[i] = list(dict.fromkeys(conditions))
+
+        return props.tolist(), unknown
+
+    def get_health_conditions(self):
+        return self.model["health_conditions"]
 
     def get_professions(self):
-        return self.dataframe["Profession"].unique()
+        return self.model["professions"]
 
     def get_genres(self):
-        return self.dataframe["Genre"].unique()
+        return self.model["genres"]
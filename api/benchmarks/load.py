@@ -0,0 +1,78 @@
+"""
+Load test of a running API (eg. a local `uvicorn main:app`): the latency
+percentiles (p50, p99) and the throughput of the predictions and of the
+entries, at an increasing number of concurrent clients.
+
+Usage: python -m benchmarks.load [url] [requests] [concurrency...]
+"""
+
+import asyncio
+import sys
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.synthetic import make_inputs
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 60):
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return time.perf_counter() - start
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+
+    raise TimeoutError(f"{client.base_url} is not ready")
+
+
+async def run(client: httpx.AsyncClient, send, count: int, concurrency: int):
+    """
+    Sends `count` requests from `concurrency` clients, and returns the
+    latency of each one and the total duration.
+    """
+    latencies = []
+    queue = iter(range(count))
+
+    async def worker():
+        for i in queue:
+            start = time.perf_counter()
+            response = await send(client, i)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    return np.array(latencies), time.perf_counter() - start
+
+
+async def main(
+    url: str = "http://127.0.0.1:8000", count: int = 2000, *concurrencies: int
+):
+    inputs = make_inputs(count)
+    endpoints = {
+        "/input": lambda client, i: client.post("/input", json=inputs[i]),
+        "/entries": lambda client, i: client.get("/entries"),
+    }
+
+    limits = httpx.Limits(max_connections=max(concurrencies or [128]))
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        print(f"{url} ready after {await wait_ready(client):.2f}s")
+
+        for name, send in endpoints.items():
+            for concurrency in concurrencies or [1, 8, 32, 128]:
+                latencies, duration = await run(client, send, count, concurrency)
+                p50, p99 = np.percentile(latencies, [50, 99]) * 1e3
+                print(
+                    f"{name} x{concurrency}: p50 {p50:.1f}ms, p99 {p99:.1f}ms, "
+                    f"{count / duration:,.0f} req/s"
+                )
+
+
+if __name__ == "__main__":
+    url, *args = sys.argv[1:] or ["http://127.0.0.1:8000"]
+    asyncio.run(main(url, *map(int, args)))
@@ -0,0 +1,83 @@
+"""
+Compare the prediction throughput of the count tables against the
+previous implementation, which scanned the dataframe on every request.
+
+Usage: python -m benchmarks.predict [rows]
+"""
+
+import sys
+import time
+
+from ai import EligibilityPrediction
+from benchmarks.synthetic import make_dataframe, make_inputs
+
+
+def legacy_predict(
+    dataframe, health_conditions=[], genre=None, professions=[], age=None
+):
+    eligible = dataframe[dataframe["Eligible"]]
+
+    if not (health_conditions or genre or professions or age):
+        return eligible["Eligible"].count() / dataframe["Eligible"].count()
+
+    prop = 1
+
+    if genre:
+        eprop_genre = eligible[eligible[["Genre"]] == genre]["Genre"].count() or 1
+        prop_genre = dataframe[dataframe[["Genre"]] == genre]["Genre"].count() or 1
+        prop *= eprop_genre / prop_genre
+
+    for profession in professions:
+        eprop_profession = (
+            eligible[eligible["Profession"] == profession]["Profession"].count() or 1
+        )
+        prop_profession = (
+            dataframe[dataframe["Profession"] == profession]["Profession"].count() or 1
+        )
+        prop *= eprop_profession / prop_profession
+
+    if age:
+        eprop_age = eligible[eligible["Age"] == age]["Age"].count() or 1
+        prop_age = dataframe[dataframe["Age"] == age]["Age"].count() or 1
+        prop *= eprop_age / prop_age
+
+    start_column = dataframe.columns.get_loc("ÉLIGIBILITÉ AU DON.")
+    end_column = dataframe.columns.get_loc("Si autres raison préciser")
+    conditions = dataframe.columns[start_column + 1 : end_column]
+    for health_condition in health_conditions:
+        if (conditions == health_condition).any():
+            prop *= 0
+
+    return prop
+
+
+def requests_per_second(predict, inputs) -> float:
+    start = time.perf_counter()
+    for kwargs in inputs:
+        predict(**kwargs)
+
+    return len(inputs) / (time.perf_counter() - start)
+
+
+def main(rows: int = 1_000_000):
+    dataframe = make_dataframe(rows)
+
+    start = time.perf_counter()
+    ai = EligibilityPrediction.from_dataset(dataframe)
+    print(f"rows: {rows}, tables built in {time.perf_counter() - start:.2f}s")
+
+    # Both implementations must agree
+    for kwargs in make_inputs(20, seed=1):
+        assert abs(legacy_predict(dataframe, **kwargs) - ai.predict(**kwargs)) < 1e-12
+
+    before = requests_per_second(
+        lambda **kwargs: legacy_predict(dataframe, **kwargs), make_inputs(20)
+    )
+    after = requests_per_second(ai.predict, make_inputs(100_000))
+
+    print(f"before: {before:,.1f} req/s")
+    print(f"after: {after:,.1f} req/s ({after / before:,.0f}x)")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,70 @@
+"""
+Compare the loading of the model from its file (see `model.py`) against the
+previous behavior which loaded the whole dataset to build it, in time and
+peak memory (RSS) of a new process, on a synthetic dataset.
+
+Usage: python -m benchmarks.startup [rows]
+"""
+
+import json
+import pathlib
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.synthetic import make_dataframe
+from dataset import get_cache_file, save_dataset
+from model import build_model, get_model_file, save_model
+
+
+# NB: The peak RSS is read from VmHWM, as ru_maxrss is inherited from the parent
+CODE = """
+import json, re, sys, time
+start = time.perf_counter()
+from ai import EligibilityPrediction
+EligibilityPrediction.{method}(sys.argv[1])
+duration = time.perf_counter() - start
+with open("/proc/self/status") as f:
+    peak = int(re.search(r"VmHWM:\\s+(\\d+) kB", f.read()).group(1)) * 1024
+print(json.dumps([duration, peak]))
+"""
+
+
+def startup(method: str, dataset_file) -> tuple[float, int]:
+    output = subprocess.run(
+        [sys.executable, "-c", CODE.format(method=method), str(dataset_file)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+    return json.loads(output)
+
+
+def main(rows: int = 1_000_000):
+    dataframe = make_dataframe(rows)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset_file = pathlib.Path(tmp_dir) / "dataset.xlsx"
+        # Only the Arrow cache, used when the dataset file is missing
+        dataset_file.touch()
+        save_dataset(dataframe, dataset_file)
+        dataset_file.unlink()
+        save_model(build_model(dataframe), dataset_file)
+
+        sizes = [get_cache_file(dataset_file), get_model_file(dataset_file)]
+        print(
+            f"rows: {rows}, dataset: {sizes[0].stat().st_size / 1e6:.1f}MB, "
+            f"model: {sizes[1].stat().st_size / 1e3:.1f}kB"
+        )
+
+        before = startup("from_dataset", dataset_file)
+        after = startup("load", dataset_file)
+        print(
+            f"startup: {before[0]:.2f}s -> {after[0]:.2f}s, "
+            f"RSS: {before[1] / 1e6:.0f}MB -> {after[1] / 1e6:.0f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,74 @@
+"""
+Synthetic preprocessed dataset, shaped like `data/preprocessed/dataset.xlsx`,
+used to benchmark the API without the real data.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+HEALTH_CONDITIONS = [
+    "Est sous anti-biothérapie",
+    "Taux d’hémoglobine bas",
+    "date de dernier Don < 3 mois",
+    "IST récente (Exclu VIH, Hbs, Hcv)",
+    "Antécédent de transfusion",
+    "Porteur(HIV,hbs,hcv)",
+    "Opéré",
+    "Drepanocytaire",
+    "Diabétique",
+    "Hypertendus",
+    "Asthmatiques",
+    "Cardiaque",
+    "Tatoué",
+    "Scarifié",
+]
+GENRES = ["Homme", "Femme"]
+PROFESSIONS = [f"Profession {i}" for i in range(400)]
+
+
+def make_dataframe(rows: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+
+    ages = rng.integers(18, 70, rows).astype(float)
+    # Most of the registrations don't provide the age
+    ages[rng.random(rows) < 0.6] = np.nan
+
+    columns = {
+        "Genre": rng.choice(GENRES, rows, p=[0.9, 0.1]),
+        "Profession": rng.choice(PROFESSIONS, rows),
+        "ÉLIGIBILITÉ AU DON.": np.ones(rows, dtype=int),
+    }
+    for health_condition in HEALTH_CONDITIONS:
+        columns[health_condition] = (rng.random(rows) < 0.01).astype(int)
+    columns["Si autres raison préciser"] = np.full(rows, "nan")
+    columns["Age"] = ages
+
+    dataframe = pd.DataFrame(columns)
+    dataframe["Eligible"] = dataframe[HEALTH_CONDITIONS].sum(axis=1) == 0
+
+    return dataframe
+
+
+def make_inputs(count: int, seed: int = 0) -> list[dict]:
+    """
+    Returns random keyword arguments for `EligibilityPrediction.predict`.
+    """
+    rng = np.random.default_rng(seed)
+    inputs = []
+
+    for _ in range(count):
+        inputs.append(
+            {
+                "health_conditions": (
+                    [str(rng.choice(HEALTH_CONDITIONS))] if rng.random() < 0.2 else []
+                ),
+                "genre": str(rng.choice(GENRES)) if rng.random() < 0.8 else None,
+                "professions": (
+                    [str(rng.choice(PROFESSIONS))] if rng.random() < 0.8 else []
+                ),
+                "age": int(rng.integers(18, 70)) if rng.random() < 0.8 else None,
+            }
+        )
+
+    return inputs
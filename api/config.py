@@ -1,5 +1,21 @@
+import os
 import pathlib
 
 BASE_DIR = pathlib.Path(__file__).parent
 
 PREPROCESSED_DATASET_FILE = BASE_DIR / "data/preprocessed/dataset.xlsx"
+
+# Number of inputs scored at once by the batch prediction
+BATCH_CHUNK_SIZE = 10_000
+# Size above which a streamed batch body is spooled to disk
+BATCH_SPOOL_SIZE = 1024 * 1024
+# How long the clients can reuse the entries before revalidating them (seconds)
+ENTRIES_MAX_AGE = int(os.getenv("ENTRIES_MAX_AGE", "60"))
+# Number of threads scoring the batches
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", str(os.cpu_count() or 1)))
+# How often the model file is checked, to reload it when changed (seconds, 0
+# to only load it at startup)
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "5"))
+# Token required by `POST /reload` (Authorization: Bearer <token>), which is
+# disabled if not set
+RELOAD_TOKEN = os.getenv("RELOAD_TOKEN")
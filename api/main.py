@@ -1,12 +1,25 @@
 from ai import EligibilityPrediction
-from fastapi import FastAPI
-from pydantic import BaseModel
+from model import get_model_file
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, TypeAdapter, ValidationError
+import asyncio
 import config
+import contextlib
+import csv
+import hashlib
+import hmac
+import io
+import itertools
+import json
+import logging
+import pathlib
+import tempfile
 
 
-app = FastAPI()
-# initialize the ai model
-ai = EligibilityPrediction(config.PREPROCESSED_DATASET_FILE)
+logger = logging.getLogger(__name__)
 
 
 class Input(BaseModel):
@@ -27,24 +40,420 @@ class Output(BaseModel):
     score: float
 
 
-@app.get("/entries")
-def get_entries() -> Entry:
+class DetailedOutput(Output):
+    # Health conditions not known by the model, so ignored by the prediction
+    unknown_health_conditions: list[str] = []
+
+
+InputList = TypeAdapter(list[Input])
+
+
+# The AI model and its entries (JSON, ETag), loaded at startup and reloaded
+# when its file changes (see `watch_model`). They are swapped at once, so that
+# a request gets both from the same dataset.
+snapshot: tuple[EligibilityPrediction, tuple[bytes, str]] | None = None
+load_error: Exception | None = None
+# Only one loading at once
+load_lock = asyncio.Lock()
+# Executor of the CPU-bound scoring (batches)
+executor: ThreadPoolExecutor | None = None
+
+
+def make_entries(model: EligibilityPrediction) -> tuple[bytes, str]:
+    """
+    Returns the entries of the model as JSON, with their ETag.
+    """
     entries = Entry(
-        health_conditions=ai.get_health_conditions(),
-        professions=ai.get_professions(),
-        genres=ai.get_genres(),
+        health_conditions=model.get_health_conditions(),
+        professions=model.get_professions(),
+        genres=model.get_genres(),
     )
+    body = entries.model_dump_json().encode()
+
+    return body, f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+
+
+def load_snapshot() -> tuple[EligibilityPrediction, tuple[bytes, str]]:
+    """
+    Loads the AI model (built again if the dataset file changed), and
+    precomputes the entries.
+    """
+    model = EligibilityPrediction.load(config.PREPROCESSED_DATASET_FILE)
+
+    return model, make_entries(model)
+
+
+async def reload_model() -> EligibilityPrediction:
+    """
+    Loads the AI model in a thread, then swaps it with the served one, if its
+    version changed. The requests being served finish with the previous one.
+
+    On failure, the previous model is still served.
+    """
+    global snapshot, load_error
+
+    async with load_lock:
+        try:
+            new_snapshot = await asyncio.to_thread(load_snapshot)
+        except Exception as err:
+            logger.exception("Unable to load the model")
+            load_error = err
+            raise
+
+        load_error = None
+        if snapshot is None or snapshot[0].version != new_snapshot[0].version:
+            snapshot = new_snapshot
+            logger.info(f"Model {snapshot[0].version} loaded!")
+
+        return snapshot[0]
+
+
+def get_mtime(path: pathlib.Path) -> int | None:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+async def watch_model():
+    """
+    Loads the AI model, then reloads it whenever its file or the dataset file
+    changes (eg. after a preprocessing), every `MODEL_WATCH_INTERVAL` seconds.
+    Until loaded, it is tried again.
+    """
+    files = [
+        get_model_file(config.PREPROCESSED_DATASET_FILE),
+        config.PREPROCESSED_DATASET_FILE,
+    ]
+    loaded_mtimes = None
+
+    while True:
+        mtimes = [get_mtime(x) for x in files]
+        if snapshot is None or mtimes != loaded_mtimes:
+            loaded_mtimes = mtimes
+            # NB: Already logged
+            with contextlib.suppress(Exception):
+                await reload_model()
+
+        if not config.MODEL_WATCH_INTERVAL:
+            return
+        await asyncio.sleep(config.MODEL_WATCH_INTERVAL)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    global executor
+
+    executor = ThreadPoolExecutor(config.SCORING_WORKERS, thread_name_prefix="scoring")
+    # The model is loaded in the background, so that the server answers at once
+    # (see /ready).
+    watching = asyncio.create_task(watch_model())
+
+    yield
+
+    watching.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await watching
+    executor.shutdown(cancel_futures=True)
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+async def get_snapshot() -> tuple[EligibilityPrediction, tuple[bytes, str]]:
+    # NB: Read once, so that a reload doesn't change it during the request
+    current = snapshot
+    if current is None:
+        raise HTTPException(
+            status_code=503,
+            detail="The model is not loaded",
+            headers={"Retry-After": "1"},
+        )
+
+    return current
+
+
+async def get_model(
+    current: tuple[EligibilityPrediction, tuple[bytes, str]] = Depends(get_snapshot),
+) -> EligibilityPrediction:
+    return current[0]
+
+
+async def run_scoring(function, *args):
+    """
+    Runs a CPU-bound scoring in the executor, without blocking the event loop.
+    """
+    return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+
+
+@app.get("/ready")
+async def get_ready():
+    """
+    Whether the model is loaded, and the predictions can be served, with the
+    version of its dataset.
+    """
+    current = snapshot
+    if current is None:
+        detail = f"Loading failed: {load_error}" if load_error else "Loading..."
+        raise HTTPException(status_code=503, detail=detail)
+
+    return {"ready": True, "version": current[0].version}
+
+
+async def check_reload_token(authorization: str | None = Header(None)):
+    # Disabled unless a token is configured
+    if not config.RELOAD_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    if not hmac.compare_digest(
+        (authorization or "").encode(), f"Bearer {config.RELOAD_TOKEN}".encode()
+    ):
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
 
-    return entries
+@app.post("/reload", dependencies=[Depends(check_reload_token)])
+async def post_reload():
+    """
+    Loads the model again (eg. after a preprocessing), without waiting for its
+    file to be checked (see `watch_model`), and answers once it is served.
+
+    Only with the `RELOAD_TOKEN` (Authorization: Bearer <token>).
+    """
+    try:
+        ai = await reload_model()
+    except Exception as err:
+        raise HTTPException(status_code=500, detail=f"Loading failed: {err}")
+
+    return {"version": ai.version}
+
+
+@app.get("/entries", response_model=Entry)
+async def get_entries(
+    request: Request,
+    current: tuple[EligibilityPrediction, tuple[bytes, str]] = Depends(get_snapshot),
+):
+    """
+    Returns the known values of the inputs.
+
+    They don't change for a loaded model, so they can be revalidated with
+    their ETag (If-None-Match), and are then answered with a 304.
+    """
+    ai, (body, etag) = current
+    headers = {
+        "ETag": etag,
+        "X-Dataset-Version": ai.version,
+        "Cache-Control": f"public, max-age={config.ENTRIES_MAX_AGE}",
+    }
+
+    if_none_match = request.headers.get("if-none-match", "")
+    tags = [x.strip().removeprefix("W/") for x in if_none_match.split(",")]
+    if etag in tags or "*" in tags:
+        return Response(status_code=304, headers=headers)
+
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @app.post("/input")
-def post_input(_input: Input) -> Output:
-    score = ai.predict(
+async def post_input(
+    _input: Input, ai: EligibilityPrediction = Depends(get_model)
+) -> DetailedOutput:
+    # NB: A few lookups, faster in the event loop than in the executor
+    score, unknown_health_conditions = ai.predict_details(
         health_conditions=_input.health_conditions,
         professions=_input.professions,
         age=_input.age,
         genre=_input.genre,
     )
 
-    return Output(score=score)
+    return DetailedOutput(
+        score=score, unknown_health_conditions=unknown_health_conditions
+    )
+
+
+def parse_error(error_type: str, msg: str, _input) -> list[dict]:
+    # Same shape as the validation errors
+    return [{"type": error_type, "loc": [], "msg": msg, "input": _input}]
+
+
+def parse_ndjson(body):
+    """
+    Yields an Input (or its errors) per line of a NDJSON body.
+    """
+    for line in body:
+        if not line.strip():
+            continue
+
+        try:
+            line = line.decode("utf-8").rstrip("\r\n")
+        except UnicodeDecodeError:
+            text = line.decode("utf-8", errors="replace").rstrip("\r\n")
+            yield parse_error("unicode_decode_error", "Invalid UTF-8", text)
+            continue
+
+        try:
+            yield Input.model_validate_json(line)
+        except ValidationError as err:
+            yield err.errors(include_url=False)
+
+
+def parse_csv(body):
+    """
+    Yields an Input (or its errors) per row of a CSV body.
+
+    The expected columns are age, genre, professions and health_conditions,
+    where the values of a list are separated by "|".
+    """
+    # NB: The invalid UTF-8 is kept as surrogates, to be reported by row
+    lines = io.TextIOWrapper(
+        body, encoding="utf-8-sig", errors="surrogateescape", newline=""
+    )
+    reader = csv.DictReader(lines)
+
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as err:
+            # The reader goes on with the next line
+            yield parse_error("csv_error", str(err), None)
+            continue
+
+        values = [x for x in row.values() if isinstance(x, str)]
+        try:
+            "".join(values).encode("utf-8")
+        except UnicodeEncodeError:
+            text = [
+                x.encode("utf-8", "surrogateescape").decode("utf-8", "replace")
+                for x in values
+            ]
+            yield parse_error("unicode_decode_error", "Invalid UTF-8", text)
+            continue
+
+        try:
+            yield Input(
+                age=row.get("age") or None,
+                genre=row.get("genre") or None,
+                professions=[x for x in (row.get("professions") or "").split("|") if x],
+                health_conditions=[
+                    x for x in (row.get("health_conditions") or "").split("|") if x
+                ],
+            )
+        except ValidationError as err:
+            yield err.errors(include_url=False)
+
+
+BATCH_PARSERS = {
+    "application/x-ndjson": parse_ndjson,
+    "application/jsonl": parse_ndjson,
+    "text/csv": parse_csv,
+}
+
+
+def batch_outputs(
+    ai: EligibilityPrediction, inputs: list[dict]
+) -> list[DetailedOutput]:
+    """
+    Scores the inputs, with their unknown health conditions like `/input`.
+    """
+    scores, unknown = ai.predict_batch_details(inputs)
+
+    return [
+        DetailedOutput(score=score, unknown_health_conditions=conditions)
+        for score, conditions in zip(scores, unknown)
+    ]
+
+
+def score_chunk(ai: EligibilityPrediction, records) -> bytes:
+    """
+    Scores the next chunk of records and returns them as NDJSON lines.
+    """
+    chunk = list(itertools.islice(records, config.BATCH_CHUNK_SIZE))
+    outputs = iter(
+        batch_outputs(ai, [x.model_dump() for x in chunk if isinstance(x, Input)])
+    )
+    lines = []
+
+    for record in chunk:
+        if isinstance(record, Input):
+            lines.append(next(outputs).model_dump_json())
+        else:
+            # We keep the order, so an invalid record gets its errors as output
+            lines.append(json.dumps({"score": None, "errors": record}, default=str))
+
+    return "".join(f"{line}\n" for line in lines).encode()
+
+
+async def stream_scores(ai: EligibilityPrediction, records, body):
+    try:
+        while data := await run_scoring(score_chunk, ai, records):
+            yield data
+    finally:
+        body.close()
+
+
+@app.post(
+    "/input/batch",
+    response_model=list[DetailedOutput],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "type": "array",
+                        "items": {"$ref": "#/components/schemas/Input"},
+                    }
+                },
+                "application/x-ndjson": {
+                    "schema": {"$ref": "#/components/schemas/Input"}
+                },
+                "text/csv": {
+                    "schema": {"type": "string"},
+                    "example": "age,genre,professions,health_conditions\n"
+                    "25,Homme,Etudiant,\n",
+                },
+            },
+        }
+    },
+)
+async def post_input_batch(
+    request: Request, ai: EligibilityPrediction = Depends(get_model)
+):
+    """
+    Scores a list of inputs, in the same order.
+
+    A JSON list is answered with a JSON list. A NDJSON or CSV body is
+    scored chunk by chunk and answered with a NDJSON stream, so that the
+    memory usage stays flat for large batches.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+
+    if content_type == "application/json":
+        try:
+            inputs = InputList.validate_json(await request.body())
+        except ValidationError as err:
+            raise RequestValidationError(err.errors()) from err
+
+        return await run_scoring(batch_outputs, ai, [x.model_dump() for x in inputs])
+
+    if content_type not in BATCH_PARSERS:
+        raise HTTPException(
+            status_code=415, detail=f"Unsupported content type: {content_type}"
+        )
+
+    # Spool the body, so that a large batch doesn't stay in memory. Written in a
+    # thread, since it goes to the disk past BATCH_SPOOL_SIZE.
+    body = tempfile.SpooledTemporaryFile(max_size=config.BATCH_SPOOL_SIZE)
+    async for data in request.stream():
+        await asyncio.to_thread(body.write, data)
+    body.seek(0)
+
+    return StreamingResponse(
+        stream_scores(ai, BATCH_PARSERS[content_type](body), body),
+        media_type="application/x-ndjson",
+    )
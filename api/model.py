@@ -0,0 +1,151 @@
+"""
+Eligibility model of the API: the number of eligible donors and of donors,
+overall and by genre, profession and age, with the known health conditions,
+genres and professions. It is all the prediction needs, so that the API
+doesn't load the dataset.
+
+Keep in sync with `dashboard/preprocess/model.py`, which writes it.
+"""
+
+import hashlib
+import json
+import logging
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+from dataset import apply_schema, fingerprint, is_fresh
+
+
+logger = logging.getLogger(__name__)
+
+
+__all__ = [
+    "get_model_file",
+    "build_model",
+    "model_checksum",
+    "save_model",
+    "load_model",
+]
+
+
+# Version of the model file, to bump when its content changes
+MODEL_VERSION = "1"
+
+# Columns of the count tables
+COUNT_COLUMNS = ["Genre", "Profession", "Age"]
+
+
+def get_model_file(dataset_file) -> pathlib.Path:
+    """
+    Returns the path of the JSON file which stores the model.
+    """
+    path = pathlib.Path(dataset_file)
+
+    return path.with_name(f"{path.stem}.model.json")
+
+
+def to_json(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def sort_table(table) -> list:
+    # The most frequent values first, in the same order whatever the parts
+    return sorted(table, key=lambda x: (-x[2], str(x[0])))
+
+
+def build_model(dataframe: pd.DataFrame) -> dict:
+    """
+    Returns the model of the dataset.
+
+    Each count table is a list of [value, eligible count, count], by value
+    of its column (the missing values apart).
+    """
+    columns = dataframe.columns
+    start_column = columns.get_loc("ÉLIGIBILITÉ AU DON.")
+    end_column = columns.get_loc("Si autres raison préciser")
+
+    dataframe = apply_schema(dataframe[["Eligible", *COUNT_COLUMNS]])
+    eligible = dataframe[dataframe["Eligible"]]
+
+    counts = {}
+    for column in COUNT_COLUMNS:
+        eligible_counts = eligible[column].value_counts()
+        counts[column] = sort_table(
+            [to_json(value), int(eligible_counts.get(value, 0)), int(count)]
+            for value, count in dataframe[column].value_counts().items()
+            if count
+        )
+
+    return {
+        "eligible_count": int(eligible["Eligible"].count()),
+        "total_count": int(dataframe["Eligible"].count()),
+        "health_conditions": list(columns[start_column + 1 : end_column]),
+        "genres": [to_json(x) for x in dataframe["Genre"].dropna().unique()],
+        "professions": [to_json(x) for x in dataframe["Profession"].dropna().unique()],
+        "counts": counts,
+    }
+
+
+def dump_model(model: dict) -> bytes:
+    return json.dumps(model, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def model_checksum(model: dict) -> str:
+    """
+    Returns the checksum of the model, as in the header of its file, which
+    identifies its version of the dataset.
+    """
+    return hashlib.sha256(dump_model(model)).hexdigest()
+
+
+def save_model(model: dict, dataset_file):
+    """
+    Saves the model next to the dataset file.
+
+    The file starts with a header line (version, checksum of the model,
+    fingerprint of the dataset file), followed by the model in JSON.
+    """
+    data = dump_model(model)
+    header = {
+        "model_version": MODEL_VERSION,
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
+    # Like the Arrow cache, so that the model is built again when the dataset changes
+    if pathlib.Path(dataset_file).exists():
+        header |= {x.decode(): y.decode() for x, y in fingerprint(dataset_file).items()}
+
+    # Write then rename, so that a reader never sees a partial file
+    model_file = get_model_file(dataset_file)
+    tmp_file = model_file.with_suffix(".tmp")
+    tmp_file.write_bytes(json.dumps(header).encode() + b"\n" + data)
+    tmp_file.replace(model_file)
+    logger.info(f"Model saved to {model_file} ({len(data)} bytes)")
+
+
+def load_model(model_file, dataset_file=None) -> dict | None:
+    """
+    Loads the model, if saved by the same version (and from the current
+    dataset file, if given).
+
+    Raises a `ValueError` if the model doesn't match its checksum.
+    """
+    with open(model_file, "rb") as f:
+        header = json.loads(f.readline())
+        if header.get("model_version") != MODEL_VERSION:
+            logger.info(f"{model_file} is outdated!")
+            return None
+
+        metadata = {x.encode(): str(y).encode() for x, y in header.items()}
+        if dataset_file is not None and not is_fresh(dataset_file, metadata):
+            logger.info(f"{model_file} is stale!")
+            return None
+
+        data = f.read()
+
+    if hashlib.sha256(data).hexdigest() != header.get("sha256"):
+        raise ValueError(f"{model_file} is corrupted (checksum mismatch)")
+
+    logger.info(f"Loading of the model from {model_file}...")
+    return json.loads(data)
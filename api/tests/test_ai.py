@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from ai import EligibilityPrediction
+from benchmarks.synthetic import (
+    GENRES,
+    HEALTH_CONDITIONS,
+    PROFESSIONS,
+    make_dataframe,
+    make_inputs,
+)
+
+
+@pytest.fixture(scope="module")
+def ai() -> EligibilityPrediction:
+    return EligibilityPrediction.from_dataset(make_dataframe(5000))
+
+
+def make_edge_inputs(count: int, seed: int = 1) -> list[dict]:
+    """
+    Returns random inputs, with unknown and repeated values, empty strings,
+    zero ages and several professions.
+    """
+    rng = np.random.default_rng(seed)
+    health_conditions = [*HEALTH_CONDITIONS[:3], "Unknown", "Other", ""]
+    genres = [*GENRES, "Unknown", "", None]
+    professions = [*PROFESSIONS[:5], "Unknown"]
+    ages = [None, 0, 18, 30, 45, 200]
+
+    return [
+        {
+            "health_conditions": [
+                str(x) for x in rng.choice(health_conditions, rng.integers(0, 4))
+            ],
+            "genre": genres[rng.integers(len(genres))],
+            "professions": [
+                str(x) for x in rng.choice(professions, rng.integers(0, 3))
+            ],
+            "age": ages[rng.integers(len(ages))],
+        }
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.parametrize(
+    "inputs", [make_inputs(2000), make_edge_inputs(2000)], ids=["synthetic", "edge"]
+)
+def test_predict_batch(ai, inputs):
+    expected = [ai.predict_details(**x) for x in inputs]
+    scores, unknown = ai.predict_batch_details(inputs)
+
+    assert scores == [score for score, _ in expected]
+    assert unknown == [conditions for _, conditions in expected]
+    assert ai.predict_batch(inputs) == scores
+
+
+def test_predict_batch_empty(ai):
+    assert ai.predict_batch([]) == []
+    assert ai.predict_batch_details([]) == ([], [])
+
+
+def test_predict_without_criteria(ai):
+    score = ai.eligible_count / ai.total_count
+
+    assert ai.predict() == score
+    assert ai.predict_batch([{}, {"health_conditions": [], "age": None}]) == [
+        score,
+        score,
+    ]
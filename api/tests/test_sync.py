@@ -0,0 +1,67 @@
+"""
+The dataset and model modules of the API are copies of the ones of the
+dashboard preprocessing (see "Keep in sync"), checked here without importing
+the dashboard.
+"""
+
+import ast
+import pathlib
+
+import pytest
+
+
+API_DIR = pathlib.Path(__file__).parents[1]
+PREPROCESS_DIR = API_DIR.parent / "dashboard" / "preprocess"
+
+# Module -> names (constants and functions) shared with the preprocessing
+SHARED = {
+    "dataset.py": [
+        "NA_VALUES",
+        "CATEGORY_COLUMNS",
+        "DIGITIZED_COLUMNS",
+        "SMALL_INT_COLUMNS",
+        "get_cache_file",
+        "fingerprint",
+        "is_fresh",
+        "apply_schema",
+        "load_dataset",
+    ],
+    "model.py": [
+        "MODEL_VERSION",
+        "COUNT_COLUMNS",
+        "to_json",
+        "sort_table",
+        "build_model",
+        "dump_model",
+        "save_model",
+    ],
+}
+
+
+def definitions(path: pathlib.Path) -> dict[str, str]:
+    """
+    Returns the AST of the top-level constants and functions (without their
+    docstrings, which can differ), by name.
+    """
+    result = {}
+    for node in ast.parse(path.read_text()).body:
+        if isinstance(node, ast.FunctionDef):
+            if ast.get_docstring(node):
+                node.body = node.body[1:]
+            result[node.name] = ast.dump(node)
+        elif isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name):
+            result[node.targets[0].id] = ast.dump(node.value)
+
+    return result
+
+
+@pytest.mark.parametrize(
+    "module, name",
+    [(module, name) for module, names in SHARED.items() for name in names],
+)
+def test_in_sync(module, name):
+    api = definitions(API_DIR / module)
+    preprocess = definitions(PREPROCESS_DIR / module)
+
+    assert name in api and name in preprocess
+    assert api[name] == preprocess[name], f"{module}: {name} differs"
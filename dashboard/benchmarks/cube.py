@@ -0,0 +1,76 @@
+"""
+Compare the year-filtered figures answered from the aggregate cube against
+the previous behavior which scanned the rows of the year on each callback,
+on a synthetic dataset.
+
+Usage: python -m benchmarks.cube [rows]
+"""
+
+import sys
+import time
+
+from dashboard import Dashboard
+from preprocess.cube import build_cube
+from preprocess.dataset import apply_schema
+
+from .memory import make_dataframe
+
+
+class LegacyDashboard(Dashboard):
+    """Filters and groups the rows on each figure, as before."""
+
+    def count(self, selected_year, *columns):
+        sources = ["Year", *(x for x in columns if x != "Retention Category")]
+        df = self.view(*dict.fromkeys(sources), "A-t-il (elle) déjà donné le sang")
+        df = df[df["Year"] == selected_year]
+        df["Retention Category"] = df["A-t-il (elle) déjà donné le sang"].map(
+            {0: "First-Time", 1: "Repeat Donor"}
+        )
+
+        return df.groupby(list(columns), observed=True).size().reset_index(name="Count")
+
+
+def main(rows: int = 1_000_000):
+    dataframe = apply_schema(make_dataframe(rows))
+
+    start = time.perf_counter()
+    cube = build_cube(dataframe)
+    duration = time.perf_counter() - start
+    print(f"rows: {rows}, cube: {len(cube)} rows built in {duration:.2f}s")
+
+    before, after = (
+        LegacyDashboard(dataframe, cube=cube),
+        Dashboard(dataframe, cube=cube),
+    )
+
+    queries = [("Year", "Month"), ("Profession",), ("Age", "Retention Category")]
+    for columns in queries:
+        durations = []
+        for dashboard in (before, after):
+            start = time.perf_counter()
+            dashboard.count(2020, *columns)
+            durations.append(time.perf_counter() - start)
+        print(
+            f"count {list(columns)}: {durations[0] * 1e3:.1f}ms -> "
+            f"{durations[1] * 1e3:.1f}ms ({durations[0] / durations[1]:.0f}x)"
+        )
+
+    callbacks = [
+        ("campaign", "campaign_effectiveness", 2020),
+        ("retention", "donor_retention", 2020),
+        ("feedback", "feedback_analysis", 2020, "Profession"),
+    ]
+    for name, method, *args in callbacks:
+        durations = []
+        for dashboard in (before, after):
+            start = time.perf_counter()
+            getattr(dashboard, method)(*args)
+            durations.append(time.perf_counter() - start)
+        print(
+            f"{name}: {durations[0]:.2f}s -> {durations[1]:.2f}s "
+            f"({durations[0] / durations[1]:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
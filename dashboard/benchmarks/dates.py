@@ -0,0 +1,111 @@
+"""
+Compare the vectorized date cleaning and age computation against the
+previous per-cell implementation, on a synthetic sheet.
+
+Usage: python -m benchmarks.dates [rows]
+"""
+
+import re
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from preprocess import utils
+
+
+def legacy_clean_date(value: str) -> str:
+    re_year = r"[12]\d{3}"
+    re_month = r"0?[1-9]|1[0-2]"
+    re_day = r"0?[1-9]|[1-2][0-9]|3[0-1]"
+    re_date_1 = (
+        rf"(?P<years>{re_year})(/|-)(?P<months>({re_month}))\2(?P<days>({re_day}))"
+    )
+    re_date_2 = (
+        rf"(?P<days>{re_day})(/|-)(?P<months>({re_month}))\2(?P<years>{re_year})"
+    )
+
+    for i in [re_date_1, re_date_2]:
+        data = re.match(i, value)
+        if not data:
+            continue
+
+        return "{years}-{months:0>2}-{days:0>2}".format(**data.groupdict())
+
+    return None
+
+
+def legacy_calculate_age(birthdate):
+    today = datetime.today()
+
+    return (
+        today.year
+        - birthdate.year
+        - ((today.month, today.day) < (birthdate.month, birthdate.day))
+    )
+
+
+def legacy(dataframe):
+    date_columns = ["Date de remplissage de la fiche", "Date de naissance"]
+    dataframe[date_columns] = dataframe[date_columns].map(legacy_clean_date)
+    for column in date_columns:
+        dataframe[column] = pd.to_datetime(dataframe[column])
+
+    return (
+        dataframe["Date de naissance"]
+        .map(lambda x: legacy_calculate_age(x) if pd.notnull(x) else 0)
+        .astype(float)
+    )
+
+
+def vectorized(dataframe):
+    date_columns = ["Date de remplissage de la fiche", "Date de naissance"]
+    for column in date_columns:
+        dataframe[column] = utils.clean_dates(dataframe[column])
+
+    return utils.calculate_ages(dataframe["Date de naissance"]).fillna(0)
+
+
+def make_sheet(rows: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    days = pd.to_datetime("1950-01-01") + pd.to_timedelta(
+        rng.integers(0, 365 * 55, rows), unit="D"
+    )
+    layouts = rng.integers(0, 5, rows)
+
+    def dates():
+        values = np.where(
+            layouts == 0,
+            days.strftime("%Y-%m-%d %H:%M:%S"),
+            np.where(
+                layouts == 1,
+                days.strftime("%d-%m-%Y"),
+                np.where(layouts == 2, days.strftime("%m/%d/%Y"), "nan"),
+            ),
+        )
+        rng.shuffle(values)
+        return values
+
+    return pd.DataFrame(
+        {
+            "Date de remplissage de la fiche": dates(),
+            "Date de naissance": dates(),
+        }
+    )
+
+
+def main(rows: int = 2_000_000):
+    sheet = make_sheet(rows)
+    print(f"rows: {rows}")
+
+    for name, function in [("before", legacy), ("after", vectorized)]:
+        dataframe = sheet.copy()
+        start = time.perf_counter()
+        function(dataframe)
+        print(f"{name}: {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
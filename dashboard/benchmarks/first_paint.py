@@ -0,0 +1,89 @@
+"""
+Measure the time to first paint of the pages with figures: the page callback
+built its figures one after the other before answering, while it now answers
+with empty graphs, filled by a callback each (in parallel).
+
+Runs the app (main.py) with its test client, on the preprocessed dataset and
+with the figure cache cleared.
+
+Usage: python -m benchmarks.first_paint [runs]
+"""
+
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import main as application
+
+
+PAGES = {
+    "/donor-distribution": [
+        ("donor-map", application.update_donor_map),
+        ("donor-map-2", application.update_donor_bar),
+    ],
+    "/donor-elligibility": [
+        ("eligibility-pie", application.update_eligibility_pie),
+        ("eligibility-condition-2-bar", application.update_eligibility_overall_chart),
+    ],
+}
+
+
+def update(component_id: str, output: str, inputs: list) -> float:
+    """Times a callback, as called by the browser."""
+    start = time.perf_counter()
+    response = application.server.test_client().post(
+        "/_dash-update-component",
+        json={
+            "output": f"{component_id}.{output}",
+            "outputs": {"id": component_id, "property": output},
+            "inputs": inputs,
+            "changedPropIds": [],
+            "state": [],
+        },
+    )
+    assert response.status_code == 200, response.status_code
+
+    return time.perf_counter() - start
+
+
+def render_page(pathname: str) -> float:
+    return update(
+        "page-content",
+        "children",
+        [{"id": "url", "property": "pathname", "value": pathname}],
+    )
+
+
+def render_figure(graph_id: str) -> float:
+    return update(graph_id, "figure", [{"id": graph_id, "property": "id"}])
+
+
+def main(runs: int = 5):
+    for pathname, graphs in PAGES.items():
+        before, after, full = [], [], []
+        for _ in range(runs):
+            # Previous behavior: the figures, then the page
+            application.dashboard.cache.clear()
+            start = time.perf_counter()
+            for _, figure in graphs:
+                figure(None)
+            render_page(pathname)
+            before.append(time.perf_counter() - start)
+
+            application.dashboard.cache.clear()
+            start = time.perf_counter()
+            after.append(render_page(pathname))
+            with ThreadPoolExecutor(len(graphs)) as executor:
+                list(executor.map(render_figure, [x for x, _ in graphs]))
+            full.append(time.perf_counter() - start)
+
+        before, after, full = map(statistics.median, (before, after, full))
+        print(
+            f"{pathname}: first paint {before * 1e3:.0f}ms -> {after * 1e3:.1f}ms, "
+            f"all figures {full * 1e3:.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
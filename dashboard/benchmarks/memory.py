@@ -0,0 +1,111 @@
+"""
+Measure the peak memory of each dashboard callback, with the column-projected
+views against the previous behavior which copied the whole dataset, on a
+synthetic dataset.
+
+Usage: python -m benchmarks.memory [rows]
+"""
+
+import sys
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from dashboard import Dashboard
+
+
+HEALTH_CONDITIONS = [
+    "Est sous anti-biothérapie",
+    "Taux d’hémoglobine bas",
+    "IST récente (Exclu VIH, Hbs, Hcv)",
+    "Porteur(HIV,hbs,hcv)",
+    "Drepanocytaire",
+    "Diabétique",
+    "Hypertendus",
+]
+# Free text columns, which are not used by the figures
+TEXT_COLUMNS = [
+    "Quartier de Résidence",
+    "Si oui preciser la date du dernier don.",
+    "ID",
+    "Horodateur",
+]
+
+
+class LegacyDashboard(Dashboard):
+    """Copies the whole dataset for each figure, as before."""
+
+    def view(self, *columns):
+        return self._dataframe.copy()
+
+
+def make_dataframe(rows: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+
+    def choice(values):
+        return rng.choice(np.array(values, dtype=object), rows)
+
+    data = {
+        column: rng.integers(0, 10**9, rows).astype(str).astype(object)
+        for column in TEXT_COLUMNS
+    }
+    data |= {
+        "Niveau d'etude": choice(["Primaire", "Secondaire", "Universitaire"]),
+        "Genre": choice(["Homme", "Femme"]),
+        "Profession": choice(["Etudiant", "Commerçant", "Enseignant", "Chauffeur"]),
+        "Arrondissement de résidence": choice(["Douala I", "Douala II", "Douala V"]),
+        "Religion": choice(["Chretien (Catholique)", "Musulman", "Pas Précisé"]),
+        "A-t-il (elle) déjà donné le sang": rng.integers(0, 2, rows),
+        "ÉLIGIBILITÉ AU DON.": rng.integers(0, 2, rows),
+    }
+    for column in HEALTH_CONDITIONS:
+        data[column] = rng.integers(0, 2, rows)
+    data["Si autres raison préciser"] = choice(["", "Autre"])
+    data.update(
+        {
+            "Age": rng.integers(18, 65, rows).astype(float),
+            "Year": rng.integers(2019, 2021, rows).astype(float),
+            "Month": rng.integers(1, 13, rows).astype(float),
+            "Eligible": rng.random(rows) < 0.7,
+            "Health feedback analysis": choice(["positive", "negative", "neutral"]),
+        }
+    )
+
+    return pd.DataFrame(data)
+
+
+def peak(function, *args) -> int:
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(rows: int = 500_000):
+    dataframe = make_dataframe(rows)
+    print(
+        f"rows: {rows}, dataset: {dataframe.memory_usage(deep=True).sum() / 1e6:.0f}MB"
+    )
+
+    callbacks = [
+        ("map (bar)", "map_donor_distribution", False),
+        ("eligibility", "health_conditions_and_eligibility", "Diabétique"),
+        ("campaign", "campaign_effectiveness", 2020),
+        ("retention", "donor_retention", 2020),
+        ("feedback", "feedback_analysis", 2020, "Genre"),
+    ]
+    before, after = LegacyDashboard(dataframe), Dashboard(dataframe)
+    for name, method, *args in callbacks:
+        peak_before = peak(getattr(before, method), *args)
+        peak_after = peak(getattr(after, method), *args)
+        print(
+            f"{name}: {peak_before / 1e6:.0f}MB -> {peak_after / 1e6:.0f}MB "
+            f"({peak_before / peak_after:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
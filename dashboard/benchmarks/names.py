@@ -0,0 +1,68 @@
+"""
+Compare the name cleaning of the distinct values (with the dictionary, empty
+then already filled by a previous run) against the previous per-cell
+implementation, on a synthetic sheet.
+
+Usage: python -m benchmarks.names [rows]
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from preprocess import utils
+
+
+NAME_COLUMNS = [
+    "Niveau d'etude",
+    "Genre",
+    "Situation Matrimoniale (SM)",
+    "Profession",
+    "Arrondissement de résidence",
+    "Quartier de Résidence",
+    "Nationalité",
+    "Religion",
+]
+
+
+def make_sheet(rows: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+
+    def names(count):
+        values = np.array(
+            [f"Quartier Été {i} (précisé)" for i in range(count)] + ["nan"],
+            dtype=object,
+        )
+        return rng.choice(values, rows)
+
+    # From a few values (Genre) to a few thousands (Quartier)
+    return pd.DataFrame(
+        {column: names(2 + 5**i) for i, column in enumerate(NAME_COLUMNS)}
+    )
+
+
+def main(rows: int = 1_000_000):
+    sheet = make_sheet(rows)
+    print(f"rows: {rows}, distinct values: {sheet.nunique().sum()}")
+
+    names = utils.NameCleaner()
+    runs = [
+        ("before", lambda df: df.map(utils.clean_name)),
+        ("after (new dictionary)", names.clean),
+        ("after (filled dictionary)", names.clean),
+    ]
+    expected = None
+    for name, function in runs:
+        start = time.perf_counter()
+        dataframe = function(sheet)
+        print(f"{name}: {time.perf_counter() - start:.2f}s")
+
+        if expected is None:
+            expected = dataframe
+        assert dataframe.equals(expected)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
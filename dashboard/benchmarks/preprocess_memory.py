@@ -0,0 +1,132 @@
+"""
+Measure the peak memory (RSS) of the preprocessing, in memory (a single
+chunk) and in streaming mode, on synthetic raw rows.
+
+Usage: python -m benchmarks.preprocess_memory [chunk_size] [rows...]
+"""
+
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+import preprocess
+
+
+HEALTH_CONDITIONS = [
+    "Est sous anti-biothérapie  [Est sous anti-biothérapie]",
+    "Raison indisponibilité  [Taux d’hémoglobine bas ]",
+    "Raison indisponibilité  [date de dernier Don < 3 mois ]",
+    "Raison indisponibilité  [IST récente (Exclu VIH, Hbs, Hcv)]",
+    "Raison de non-eligibilité totale  [Drepanocytaire]",
+    "Raison de non-eligibilité totale  [Diabétique]",
+    "Raison de non-eligibilité totale  [Hypertendus]",
+]
+ARRONDISSEMENTS = ["Douala 1er", "Douala 2e", "Douala 3e", "Yaounde 1er", "Buea"]
+# Above, the in memory preprocessing needs too much memory
+MAX_IN_MEMORY_ROWS = 1_000_000
+
+
+def make_chunks(rows: int, chunk_size: int, seed: int = 42):
+    """
+    Yields the synthetic raw rows, as strings like `preprocess.load_sheets`.
+    """
+    rng = np.random.default_rng(seed)
+
+    def choice(values, size):
+        return rng.choice(np.array(values, dtype=object), size)
+
+    def dates(start, days, size):
+        values = pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days, size), "D")
+        return values.strftime("%Y-%m-%d %H:%M:%S").to_numpy(dtype=object)
+
+    for start in range(0, rows, chunk_size):
+        size = min(chunk_size, rows - start)
+        chunk = {
+            "Date de remplissage de la fiche": dates("2019-01-01", 730, size),
+            "Date de naissance": dates("1960-01-01", 365 * 40, size),
+            "Niveau d'etude": choice(["Secondaire", "Universitaire", "nan"], size),
+            "Genre": choice(["Homme", "Femme"], size),
+            "Taille": choice(["nan", "170", "165"], size),
+            "Poids": choice(["nan", "70", "82"], size),
+            "Situation Matrimoniale (SM)": choice(["Célibataire", "Marié (e)"], size),
+            "Profession": choice(["Etudiant (e)", "Commerçant", "Enseignant"], size),
+            "Arrondissement de résidence": choice(
+                [*ARRONDISSEMENTS, "Douala (Non précisé )", "nan"], size
+            ),
+            "Quartier de Résidence": choice(["Ndokoti", "Bepanda", "Makepe"], size),
+            "Nationalité": choice(["Camerounaise"], size),
+            "Religion": choice(["Chretien (Catholique)", "Musulman"], size),
+            "A-t-il (elle) déjà donné le sang": choice(["Oui", "Non"], size),
+            "Si oui preciser la date du dernier don.": choice(["nan"], size),
+            "Taux d’hémoglobine": choice(["13.5", "12,1", "nan"], size),
+            "ÉLIGIBILITÉ AU DON.": choice(
+                ["Eligible", "Définitivement non-eligible"], size
+            ),
+        }
+        for column in HEALTH_CONDITIONS:
+            chunk[column] = choice(["Oui", "Non", "nan"], size)
+        chunk["Si autres raison préciser"] = choice(
+            ["nan", "Pas de raison", "Malade et fatigué"], size
+        )
+        chunk["Age"] = choice(["nan", "25", "41"], size)
+
+        yield pd.DataFrame(chunk)
+
+
+def run(rows: int, chunk_size: int):
+    """
+    Preprocesses the rows, and prints the duration and the peak RSS (in MB).
+    """
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        preprocess.preprocess_chunks(
+            make_chunks(rows, chunk_size),
+            f"{tmp_dir}/dataset.xlsx",
+            ARRONDISSEMENTS,
+            reference_date="2025-03-01",
+            nltk_data_dir=config.NLTK_DATA_DIR,
+            excel=False,
+        )
+    duration = time.perf_counter() - start
+
+    # In KB on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{duration:.1f} {peak:.0f}")
+
+
+def measure(rows: int, chunk_size: int) -> tuple[float, float]:
+    # A process per run, so that the peaks don't add up
+    output = subprocess.run(
+        [sys.executable, "-m", __spec__.name, "--run", str(rows), str(chunk_size)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+    return tuple(map(float, output.split()[-2:]))
+
+
+def main(chunk_size: int = 50_000, *sizes: int):
+    sizes = sizes or (10_000, 100_000, 1_000_000, 5_000_000)
+
+    print(f"chunk size: {chunk_size}")
+    for rows in sizes:
+        line = f"{rows} rows:"
+        if rows <= MAX_IN_MEMORY_ROWS:
+            duration, peak = measure(rows, rows)
+            line += f" in memory {peak:.0f}MB ({duration:.0f}s),"
+        duration, peak = measure(rows, chunk_size)
+        print(f"{line} streaming {peak:.0f}MB ({duration:.0f}s)")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--run"]:
+        run(*map(int, sys.argv[2:]))
+    else:
+        main(*map(int, sys.argv[1:]))
@@ -0,0 +1,43 @@
+"""
+Measure the cleaning of synthetic raw rows with 1 to N worker processes
+(N being the number of CPUs by default).
+
+Usage: python -m benchmarks.preprocess_workers [rows] [max_workers]
+"""
+
+import os
+import sys
+import time
+
+import pandas as pd
+
+import config
+import preprocess
+from preprocess import utils
+
+from .preprocess_memory import ARRONDISSEMENTS, make_chunks
+
+
+def main(rows: int = 500_000, max_workers: int = os.cpu_count()):
+    dataframe = pd.concat(make_chunks(rows, rows))
+    print(f"rows: {rows}, cpus: {os.cpu_count()}")
+
+    baseline = None
+    for workers in range(1, max_workers + 1):
+        # New instances, so that nothing is already memoized
+        matcher = utils.ArrondissementMatcher(ARRONDISSEMENTS)
+        analyzer = utils.SentimentAnalyzer(data_dir=config.NLTK_DATA_DIR)
+        chunks = preprocess.split(dataframe, 4 * workers if workers > 1 else 1)
+
+        start = time.perf_counter()
+        pd.concat(
+            preprocess.clean_chunks(chunks, matcher, analyzer, "2025-03-01", workers)
+        )
+        duration = time.perf_counter() - start
+
+        baseline = baseline or duration
+        print(f"{workers} workers: {duration:.1f}s ({baseline / duration:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,44 @@
+"""
+Measure the donor profiling: the fit of the clustering (KMeans and PCA, or
+MiniBatchKMeans and a randomized PCA), against serving the stored profile,
+from the memory or from the disk (eg. after a restart), on a synthetic
+dataset.
+
+Usage: python -m benchmarks.profiling [rows]
+"""
+
+import sys
+import tempfile
+import time
+
+from dashboard.profiling import ProfileStore
+
+from .memory import make_dataframe
+
+
+def timing(store: ProfileStore, df_profiling) -> float:
+    start = time.perf_counter()
+    store.get_or_fit("benchmark", "Religion", df_profiling)
+
+    return time.perf_counter() - start
+
+
+def main(rows: int = 500_000):
+    dataframe = make_dataframe(rows)
+    donors = dataframe[dataframe["Eligible"]][["Age", "Genre", "Religion"]].dropna()
+    print(f"rows: {rows}, eligible donors: {len(donors)}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, minibatch_size in [("KMeans", None), ("MiniBatchKMeans", 0)]:
+            store = ProfileStore(tmp_dir, minibatch_size=minibatch_size)
+            fit = timing(store, lambda: donors)
+            memory = timing(store, lambda: donors)
+            disk = timing(ProfileStore(tmp_dir, minibatch_size), lambda: donors)
+            print(
+                f"{name}: fit {fit:.2f}s, stored {memory * 1e3:.3f}ms (memory), "
+                f"{disk * 1e3:.0f}ms (disk)"
+            )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,72 @@
+"""
+Compare the memory usage and the group by timings of the dataset with the
+compact dtypes (see `preprocess.dataset.apply_schema`) against the loaded
+dtypes (Python strings and 64 bits numbers), on a synthetic dataset.
+
+Usage: python -m benchmarks.schema [rows]
+"""
+
+import sys
+import time
+
+from dashboard import Dashboard
+from preprocess.dataset import apply_schema
+
+from .memory import make_dataframe
+
+
+GROUPS = [
+    "Genre",
+    "Profession",
+    "Arrondissement de résidence",
+    "Health feedback analysis",
+    ["Year", "Month"],
+    ["Age", "Genre"],
+]
+
+
+def timing(function, *args, runs: int = 5) -> float:
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function(*args)
+        durations.append(time.perf_counter() - start)
+
+    return min(durations)
+
+
+def main(rows: int = 1_000_000):
+    before = make_dataframe(rows)
+    after = apply_schema(before)
+
+    def memory(dataframe):
+        return dataframe.memory_usage(deep=True).sum() / 1e6
+
+    print(f"rows: {rows}, memory: {memory(before):.0f}MB -> {memory(after):.0f}MB")
+
+    for group in GROUPS:
+        durations = [
+            timing(lambda df: df.groupby(group, observed=True).size(), dataframe)
+            for dataframe in (before, after)
+        ]
+        print(
+            f"groupby {group}: {durations[0] * 1e3:.0f}ms -> "
+            f"{durations[1] * 1e3:.0f}ms ({durations[0] / durations[1]:.1f}x)"
+        )
+
+    callbacks = [
+        ("campaign", "campaign_effectiveness", 2020),
+        ("retention", "donor_retention", 2020),
+        ("feedback", "feedback_analysis", 2020, "Profession"),
+    ]
+    dashboards = Dashboard(before), Dashboard(after)
+    for name, method, *args in callbacks:
+        durations = [timing(getattr(x, method), *args, runs=1) for x in dashboards]
+        print(
+            f"{name}: {durations[0]:.2f}s -> {durations[1]:.2f}s "
+            f"({durations[0] / durations[1]:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,43 @@
+"""
+Measure the import time of the preprocess package, against the previous
+behavior which imported NLTK and downloaded its data at import.
+
+Usage: python -m benchmarks.startup [runs]
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+
+
+LEGACY = """
+import nltk
+nltk.download("punkt")
+nltk.download("stopwords")
+nltk.download("punkt_tab")
+import preprocess
+"""
+CURRENT = "import preprocess"
+
+
+def import_time(code: str, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, capture_output=True)
+        times.append(time.perf_counter() - start)
+
+    return statistics.median(times)
+
+
+def main(runs: int = 5):
+    before = import_time(LEGACY, runs)
+    after = import_time(CURRENT, runs)
+
+    print(f"before: {before:.2f}s")
+    print(f"after: {after:.2f}s ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
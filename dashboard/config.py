@@ -10,5 +10,60 @@ RAW_GEO_DATASET_FILE = BASE_DIR / "data/geo/cmr_admbnda_adm3_inc_20180104.shp"
 PREPROCESSED_GEO_DATASET_FILE = (
     BASE_DIR / "data/preprocessed/cmr_admbnda_adm3_inc_20180104.json"
 )
+# Simplification of the arrondissement boundaries, in degrees (~50m by default)
+GEO_SIMPLIFY_TOLERANCE = float(os.getenv("GEO_SIMPLIFY_TOLERANCE", "0.0005"))
+# Number of decimals kept for the coordinates (~1m by default)
+GEO_PRECISION = int(os.getenv("GEO_PRECISION", "5"))
+# Where the browser downloads the GeoJSON of the map
+GEOJSON_ROUTE = "/geo/arrondissements.json"
+# Whether only the new or modified rows are cleaned when preprocessing
+INCREMENTAL_PREPROCESS = os.getenv("INCREMENTAL_PREPROCESS", "1") == "1"
+# Number of rows cleaned at once, to bound the memory used (all at once if not set)
+PREPROCESS_CHUNK_SIZE = int(os.getenv("PREPROCESS_CHUNK_SIZE", "0")) or None
+# Number of processes cleaning the rows in parallel
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", "1"))
+# Where the NLTK data are looked for first, and downloaded if missing
+NLTK_DATA_DIR = os.getenv("NLTK_DATA_DIR", str(BASE_DIR / "data/nltk"))
 
 ELIGIBILITY_PREDICTION_API = os.getenv("ELIGIBILITY_PREDICTION_API")
+# Timeouts of the calls to the API, to connect then to read the answer (seconds)
+PREDICTION_API_CONNECT_TIMEOUT = float(os.getenv("PREDICTION_API_CONNECT_TIMEOUT", "3"))
+PREDICTION_API_READ_TIMEOUT = float(os.getenv("PREDICTION_API_READ_TIMEOUT", "10"))
+# Number of retries of a failed call (with an exponential backoff)
+PREDICTION_API_RETRIES = int(os.getenv("PREDICTION_API_RETRIES", "2"))
+# Number of connections kept alive to the API
+PREDICTION_API_POOL_SIZE = int(os.getenv("PREDICTION_API_POOL_SIZE", "10"))
+# Number of failed calls in a row after which the API is not called, and for how long
+# (seconds)
+PREDICTION_API_MAX_FAILURES = int(os.getenv("PREDICTION_API_MAX_FAILURES", "5"))
+PREDICTION_API_RESET_TIMEOUT = float(os.getenv("PREDICTION_API_RESET_TIMEOUT", "30"))
+# How long the entries of the API (genres, professions...) are kept (seconds)
+PREDICTION_API_ENTRIES_TTL = float(os.getenv("PREDICTION_API_ENTRIES_TTL", "60"))
+
+# Byte budget of the figure cache
+FIGURE_CACHE_MAX_BYTES = int(os.getenv("FIGURE_CACHE_MAX_BYTES", str(64 * 1024**2)))
+# Directory where the figures are also cached, to share them between the workers
+FIGURE_CACHE_DIR = os.getenv("FIGURE_CACHE_DIR")
+
+# Directory where the fitted donor profiling models are stored (in memory only if empty)
+PROFILING_MODELS_DIR = os.getenv(
+    "PROFILING_MODELS_DIR", str(BASE_DIR / "data/preprocessed/profiling")
+)
+# Number of eligible donors above which the profiling uses MiniBatchKMeans and a
+# randomized PCA (never if not set)
+PROFILING_MINIBATCH_SIZE = int(os.getenv("PROFILING_MINIBATCH_SIZE", "0")) or None
+
+# Number of threads running the heavy computations (eg. the donor profiling)
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "2"))
+# Interval at which a page checks if its background computations are done (ms)
+PROFILING_POLL_INTERVAL = int(os.getenv("PROFILING_POLL_INTERVAL", "500"))
+
+# Date at which the ages are computed during the preprocessing (eg. 2025-03-01).
+# Today by default, set it to get reproducible results.
+REFERENCE_DATE = os.getenv("REFERENCE_DATE")
+# How often the preprocessed dataset is checked, to reload it when saved again
+# (seconds, 0 to only load it at startup)
+DATASET_WATCH_INTERVAL = float(os.getenv("DATASET_WATCH_INTERVAL", "5"))
+# Token required by `POST /reload` (Authorization: Bearer <token>), which is
+# disabled if not set
+RELOAD_TOKEN = os.getenv("RELOAD_TOKEN")
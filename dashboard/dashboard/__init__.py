@@ -1,20 +1,61 @@
+import numpy as np
+import pandas as pd
 import plotly.express as px
 import json
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.decomposition import PCA
 
 import config
+from preprocess.cube import (
+    COUNT_COLUMN,
+    DIMENSION_COLUMN,
+    DIMENSIONS,
+    KEYS,
+    TOTAL,
+    build_cube,
+)
+from .cache import FigureCache, cached, dataframe_version
+from .client import CircuitOpenError, PredictionClient
+from .jobs import JobQueue
+from .profiling import ProfileStore
 
 
-__all__ = ["Dashboard"]
+__all__ = [
+    "CircuitOpenError",
+    "Dashboard",
+    "FigureCache",
+    "JobQueue",
+    "PredictionClient",
+    "ProfileStore",
+]
+
+
+RETENTION = "A-t-il (elle) déjà donné le sang"
 
 
 class Dashboard:
     _dataframe = None
 
-    def __init__(self, dataframe):
+    def __init__(
+        self,
+        dataframe,
+        cache: FigureCache | None = None,
+        version=None,
+        geojson: str | dict | None = None,
+        cube: pd.DataFrame | None = None,
+        profiles: ProfileStore | None = None,
+    ):
         self._dataframe = dataframe
+        # The figures are cached by the version of the dataset
+        self.cache = cache
+        self.version = version or dataframe_version(dataframe)
+        # URL or content of the GeoJSON of the map (loaded from the file if not set)
+        self.geojson = geojson
+        # Counts by year (see `preprocess.cube`), built from the rows if not set
+        if cube is None:
+            cube = build_cube(dataframe)
+        self.cube = dict(list(cube.groupby([DIMENSION_COLUMN, "Year"], observed=True)))
+        self.empty_cube = cube.iloc[:0]
+        # Fitted clustering of the donors (in memory only if not set)
+        self.profiles = profiles or ProfileStore()
 
         # Health conditions
         start_column = dataframe.columns.get_loc("ÉLIGIBILITÉ AU DON.")
@@ -25,18 +66,74 @@ class Dashboard:
         # Years
         self.years = sorted(dataframe["Year"].dropna().unique())
 
-    def get_dataframe(self):
-        return self._dataframe.copy()
+    def get_geojson(self):
+        # Loaded once
+        if self.geojson is None:
+            with open(config.PREPROCESSED_GEO_DATASET_FILE, "r", encoding="utf-8") as f:
+                self.geojson = json.load(f)
+
+        return self.geojson
+
+    def view(self, *columns: str) -> pd.DataFrame:
+        """
+        Returns the given columns of the dataset, without copying them.
+
+        The data is read-only: an in-place modification raises a ValueError,
+        while the assignment of a column (eg. `df["x"] = ...`) is still allowed,
+        since it replaces the column of the view only.
+
+        NB: The categorical and nullable columns (see
+        `preprocess.dataset.apply_schema`) are views too, but are not protected
+        from an in-place modification.
+        """
+        data = {}
+        for column in columns:
+            series = self._dataframe[column]
+            if isinstance(series.dtype, np.dtype):
+                values = series.to_numpy(copy=False).view()
+                values.flags.writeable = False
+            else:
+                # Extension array, kept as it is (eg. not converted to objects)
+                values = series.array.view()
+            data[column] = pd.Series(
+                values, index=series.index, name=column, copy=False
+            )
+
+        return pd.DataFrame(data, copy=False)
 
-    def map_donor_distribution(self, map_view=True):
-        df = self.get_dataframe()
+    def count(self, selected_year: int, *columns: str) -> pd.DataFrame:
+        """
+        Returns the number of rows of the year by the given columns (like
+        `groupby(columns).size()`), from the cube when it has them, else from
+        the rows.
+        """
+        # Columns of the cube (the retention category is computed from it)
+        sources = [RETENTION if x == "Retention Category" else x for x in columns]
+        dimensions = [x for x in sources if x in DIMENSIONS]
+
+        if len(dimensions) <= 1 and set(sources) <= {*KEYS, *DIMENSIONS}:
+            dimension = dimensions[0] if dimensions else TOTAL
+            df = self.cube.get((dimension, selected_year), self.empty_cube)
+        else:
+            df = self.view(*dict.fromkeys(["Year", *sources]))
+            df = df[df["Year"] == selected_year]
 
-        # Data preprocessing
-        # Ensure the column names match exactly with those in your dataset
-        df = df[["Arrondissement de résidence"]].dropna()
+        if "Retention Category" in columns:
+            retention = df[RETENTION].map({0: "First-Time", 1: "Repeat Donor"})
+            df = df.assign(**{"Retention Category": retention})
+
+        df_groups = df.groupby(list(columns), observed=True)
+        if COUNT_COLUMN in df:
+            return df_groups[COUNT_COLUMN].sum().reset_index(name="Count")
+
+        return df_groups.size().reset_index(name="Count")
+
+    @cached
+    def map_donor_distribution(self, map_view=True):
+        df = self.view("Arrondissement de résidence").dropna()
 
         df_counts = (
-            df.groupby("Arrondissement de résidence")
+            df.groupby("Arrondissement de résidence", observed=True)
             .size()
             .reset_index(name="Donor Count")
         )
@@ -52,14 +149,9 @@ class Dashboard:
 
             return fig
 
-        # Load GeoJSON for mapping (you need a GeoJSON file with arrondissement boundaries)
-        geojson_path = config.PREPROCESSED_GEO_DATASET_FILE  # Replace with actual path
-        with open(geojson_path, "r", encoding="utf-8") as f:
-            geojson_data = json.load(f)
-
         fig = px.choropleth_map(
             df_counts,
-            geojson=geojson_data,
+            geojson=self.get_geojson(),
             locations="Arrondissement de résidence",
             featureidkey="properties.ADM3_FR",  # Adjust based on your GeoJSON structure
             color="Donor Count",
@@ -73,8 +165,14 @@ class Dashboard:
 
         return fig
 
+    @cached
     def health_conditions_and_eligibility(self, condition: str | None = None):
-        df = self.get_dataframe()
+        if not condition:
+            df = self.view("Eligible")
+        elif condition == "all":
+            df = self.view("Eligible", *self.health_conditions)
+        else:
+            df = self.view("Eligible", condition)
 
         # Count eligible vs non-eligible donors
         df_eligibility = df["Eligible"].value_counts().reset_index()
@@ -104,7 +202,9 @@ class Dashboard:
             return fig
 
         condition_counts = (
-            df.groupby([condition, "Eligible"]).size().reset_index(name="Count")
+            df.groupby([condition, "Eligible"], observed=True)
+            .size()
+            .reset_index(name="Count")
         )
         condition_counts["Eligible"] = condition_counts["Eligible"].map(
             {True: "Eligible", False: "Non-Eligible"}
@@ -126,6 +226,7 @@ class Dashboard:
 
         return fig
 
+    @cached
     def profiling_ideal_donors(self, paired_with: str = "Religion"):
         # Selecting relevant columns for clustering
         demographic_features = [
@@ -134,42 +235,15 @@ class Dashboard:
             paired_with,
         ]
 
-        df = self.get_dataframe()
-        # Filter illigible donors
-        df = df[df["Eligible"]]
-        df_profiling = df[demographic_features].dropna()
-
-        # Encoding categorical features
-        gender_le = LabelEncoder()
-        paired_with_le = LabelEncoder()
-        df_profiling["Genre"] = gender_le.fit_transform(df_profiling["Genre"])
-        df_profiling[paired_with] = paired_with_le.fit_transform(
-            df_profiling[paired_with]
-        )
-
-        # Standardizing data
-        scaler = StandardScaler()
-        df_scaled = scaler.fit_transform(df_profiling)
+        def eligible_donors():
+            df = self.view("Eligible", *dict.fromkeys(demographic_features))
+            # Filter illigible donors
+            df = df[df["Eligible"]]
+            return df[demographic_features].dropna()
 
-        # Apply K-Means clustering
-        kmeans = KMeans(n_clusters=len(demographic_features), random_state=42)
-        df_profiling["Cluster"] = kmeans.fit_predict(df_scaled)
-
-        # Apply PCA for visualization
-        pca = PCA(n_components=2)
-        df_pca = pca.fit_transform(df_scaled)
-        df_profiling["PCA1"] = df_pca[:, 0]
-        df_profiling["PCA2"] = df_pca[:, 1]
-
-        # Generate insights into the characteristics of the ideal blood donor
-        ideal_donor = df_profiling[
-            df_profiling["Cluster"] == df_profiling["Cluster"].mode()[0]
-        ]
-        insights = [
-            round(ideal_donor["Age"].mean(), 1),
-            gender_le.inverse_transform([ideal_donor["Genre"].mode()[0]])[0],
-            paired_with_le.inverse_transform([ideal_donor[paired_with].mode()[0]])[0],
-        ]
+        # Fitted once per version of the dataset
+        profile = self.profiles.get_or_fit(self.version, paired_with, eligible_donors)
+        df_profiling, insights = profile["profiling"], profile["insights"]
 
         return px.scatter(
             df_profiling,
@@ -181,19 +255,13 @@ class Dashboard:
             hover_data=demographic_features,
         ), insights
 
+    @cached
     def campaign_effectiveness(self, selected_year: int):
-        df = self.get_dataframe()
-
-        # Aggregate donation counts per month
-        donation_trends = (
-            df.groupby(["Year", "Month"]).size().reset_index(name="Donations")
-        )
-
-        filtered_data = df[df["Year"] == selected_year]
-
         # Line Chart - Monthly Donation Trends
         trend_fig = px.line(
-            donation_trends[donation_trends["Year"] == selected_year],
+            self.count(selected_year, "Year", "Month").rename(
+                columns={"Count": "Donations"}
+            ),
             x="Month",
             y="Donations",
             title=f"Monthly Donation Trends in {selected_year}",
@@ -203,7 +271,7 @@ class Dashboard:
 
         # Bar Chart - Donations by Gender
         gender_fig = px.bar(
-            filtered_data.groupby("Genre").size().reset_index(name="Count"),
+            self.count(selected_year, "Genre"),
             x="Genre",
             y="Count",
             title=f"Donations by Gender in {selected_year}",
@@ -212,7 +280,7 @@ class Dashboard:
 
         # Bar Chart - Donations by Education Level
         education_fig = px.bar(
-            filtered_data.groupby("Niveau d'etude").size().reset_index(name="Count"),
+            self.count(selected_year, "Niveau d'etude"),
             x="Niveau d'etude",
             y="Count",
             title=f"Donations by Education Level in {selected_year}",
@@ -221,7 +289,7 @@ class Dashboard:
 
         # Bar Chart - Donations by Profession
         profession_fig = px.bar(
-            filtered_data.groupby("Profession").size().reset_index(name="Count"),
+            self.count(selected_year, "Profession"),
             x="Profession",
             y="Count",
             title=f"Donations by Profession in {selected_year}",
@@ -230,29 +298,11 @@ class Dashboard:
 
         return trend_fig, gender_fig, education_fig, profession_fig
 
+    @cached
     def donor_retention(self, selected_year: int):
-        df = self.get_dataframe()
-
-        # Identify repeat donors
-        donor_counts = (
-            df.groupby("A-t-il (elle) déjà donné le sang")
-            .size()
-            .reset_index(name="Donation Count")
-        )
-        df = df.merge(donor_counts, on="A-t-il (elle) déjà donné le sang", how="left")
-
-        # Categorize retention levels
-        df["Retention Category"] = df["A-t-il (elle) déjà donné le sang"].map(
-            {0: "First-Time", 1: "Repeat Donor"}
-        )
-
-        filtered_data = df[df["Year"] == selected_year]
-
         # Pie Chart - Repeat Donation Frequency
         pie_fig = px.pie(
-            filtered_data.groupby("Retention Category")
-            .size()
-            .reset_index(name="Count"),
+            self.count(selected_year, "Retention Category"),
             values="Count",
             color="Retention Category",
             names="Retention Category",
@@ -261,9 +311,7 @@ class Dashboard:
 
         # Bar Chart - Retention by Age Group
         age_fig = px.bar(
-            filtered_data.groupby(["Age", "Retention Category"])
-            .size()
-            .reset_index(name="Count"),
+            self.count(selected_year, "Age", "Retention Category"),
             x="Age",
             y="Count",
             color="Retention Category",
@@ -273,9 +321,7 @@ class Dashboard:
 
         # Bar Chart - Retention by Genre Group
         genre_fig = px.bar(
-            filtered_data.groupby(["Genre", "Retention Category"])
-            .size()
-            .reset_index(name="Count"),
+            self.count(selected_year, "Genre", "Retention Category"),
             x="Genre",
             y="Count",
             color="Retention Category",
@@ -285,9 +331,7 @@ class Dashboard:
 
         # Bar Chart - Retention by Profession
         profession_fig = px.bar(
-            filtered_data.groupby(["Profession", "Retention Category"])
-            .size()
-            .reset_index(name="Count"),
+            self.count(selected_year, "Profession", "Retention Category"),
             x="Profession",
             y="Count",
             color="Retention Category",
@@ -297,9 +341,9 @@ class Dashboard:
 
         # Bar Chart - Retention by Region
         region_fig = px.bar(
-            filtered_data.groupby(["Arrondissement de résidence", "Retention Category"])
-            .size()
-            .reset_index(name="Count"),
+            self.count(
+                selected_year, "Arrondissement de résidence", "Retention Category"
+            ),
             x="Arrondissement de résidence",
             y="Count",
             color="Retention Category",
@@ -309,18 +353,10 @@ class Dashboard:
 
         return pie_fig, age_fig, genre_fig, profession_fig, region_fig
 
+    @cached
     def feedback_analysis(self, selected_year: int, group_with: str):
-        df = self.get_dataframe()
-
-        df_counts = df["Health feedback analysis"].value_counts()
-        df = df.merge(df_counts, on="Health feedback analysis", how="left")
-
-        filtered_data = df[df["Year"] == selected_year]
-
         pie_fig = px.pie(
-            filtered_data.groupby("Health feedback analysis")
-            .size()
-            .reset_index(name="Count"),
+            self.count(selected_year, "Health feedback analysis"),
             values="Count",
             color="Health feedback analysis",
             names="Health feedback analysis",
@@ -328,9 +364,7 @@ class Dashboard:
         )
 
         arr_fig = px.bar(
-            filtered_data.groupby(["Health feedback analysis", group_with])
-            .size()
-            .reset_index(name="Count"),
+            self.count(selected_year, "Health feedback analysis", group_with),
             x=group_with,
             y="Count",
             color="Health feedback analysis",
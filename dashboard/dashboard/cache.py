@@ -0,0 +1,176 @@
+import collections
+import functools
+import hashlib
+import inspect
+import os
+import pathlib
+import pickle
+import tempfile
+import threading
+
+import pandas as pd
+
+
+__all__ = ["FigureCache", "cached", "dataframe_version"]
+
+
+def dataframe_version(dataframe: pd.DataFrame) -> str:
+    """
+    Returns a hash of the dataframe content, which changes with the data.
+    """
+    digest = hashlib.sha256(str(list(dataframe.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(dataframe, index=False).to_numpy())
+
+    return digest.hexdigest()[:16]
+
+
+class FigureCache:
+    """
+    LRU cache of the computed figures, bounded by a byte budget.
+
+    The size of an entry is the size of its pickle. When a directory is
+    given, the entries are also stored there, so that they are shared
+    between processes (eg. gunicorn workers). The directory has the same
+    byte budget, the least recently used files being removed first.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024**2, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = pathlib.Path(directory) if directory else None
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+        # Key -> (value, size), the least recently used first
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+    def get_or_compute(self, key: str, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+
+        data = self._read(key)
+        if data is not None:
+            value = pickle.loads(data)
+            with self._lock:
+                self.disk_hits += 1
+        else:
+            value = compute()
+            data = pickle.dumps(value)
+            self._write(key, data)
+            with self._lock:
+                self.misses += 1
+
+        self._store(key, value, len(data))
+
+        return value
+
+    def _store(self, key: str, value, size: int):
+        # Too big to be cached
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def _read(self, key: str) -> bytes | None:
+        if not self.directory:
+            return None
+
+        path = self.directory / f"{key}.pkl"
+        try:
+            data = path.read_bytes()
+            # Mark as recently used
+            os.utime(path)
+        except OSError:
+            return None
+
+        return data
+
+    def _write(self, key: str, data: bytes):
+        if not self.directory or len(data) > self.max_bytes:
+            return
+
+        # Write then rename, so that the other processes never read a partial file
+        with tempfile.NamedTemporaryFile(dir=self.directory, delete=False) as f:
+            f.write(data)
+        os.replace(f.name, self.directory / f"{key}.pkl")
+
+        files = sorted(
+            self.directory.glob("*.pkl"), key=lambda x: x.stat().st_mtime, reverse=True
+        )
+        total = 0
+        for path in files:
+            total += path.stat().st_size
+            if total > self.max_bytes:
+                path.unlink(missing_ok=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+        if self.directory:
+            for path in self.directory.glob("*.pkl"):
+                path.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def cached(method):
+    """
+    Caches the result of a Dashboard method, by its arguments, the version of
+    the dataset and the URL of the GeoJSON.
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.cache is None:
+            return method(self, *args, **kwargs)
+
+        # The same call gives the same key, whether the arguments are
+        # positional, named or default.
+        arguments = signature.bind(self, *args, **kwargs)
+        arguments.apply_defaults()
+        # The map figures embed the URL of the GeoJSON, whose hash changes with it
+        geojson = self.geojson if isinstance(self.geojson, str) else None
+        key = self.cache.make_key(
+            method.__name__,
+            list(arguments.arguments.items())[1:],
+            self.version,
+            geojson,
+        )
+
+        return self.cache.get_or_compute(key, lambda: method(self, *args, **kwargs))
+
+    return wrapper
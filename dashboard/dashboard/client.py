@@ -0,0 +1,188 @@
+import collections
+import threading
+import time
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+__all__ = ["CircuitOpenError", "PredictionClient"]
+
+
+class CircuitOpenError(requests.RequestException):
+    """The API failed too many times, and is not called for a while."""
+
+
+class PredictionClient:
+    """
+    Client of the eligibility prediction API, shared by the callbacks.
+
+    The connections are kept alive in a pool, and every request is bounded by
+    a timeout (connection, read). The failed requests are retried a few times,
+    with an exponential backoff. After `max_failures` failed calls in a row,
+    the API is not called anymore during `reset_timeout` seconds, then a
+    single call checks whether it is back (circuit breaker).
+
+    The entries (see `entries`) almost never change, so they are kept during
+    `entries_ttl` seconds, then revalidated with their ETag, and still served
+    if the API fails.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: tuple[float, float] = (3, 10),
+        retries: int = 2,
+        backoff: float = 0.2,
+        pool_size: int = 10,
+        max_failures: int = 5,
+        reset_timeout: float = 30,
+        entries_ttl: float = 60,
+        max_latencies: int = 1000,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_failures = max_failures
+        self.reset_timeout = reset_timeout
+        self.entries_ttl = entries_ttl
+
+        # NB: The prediction (POST) has no side effect, so it can be retried too
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=["GET", "POST"],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        # Consecutive failed calls, and when the circuit was opened (last checked)
+        self._failures = 0
+        self._opened_at = None
+        # (time, ETag, entries) of the last call
+        self._entries = None
+        # Path -> durations of the last calls (seconds)
+        self._latencies = collections.defaultdict(
+            lambda: collections.deque(maxlen=max_latencies)
+        )
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+        self.entries_hits = 0
+        self.entries_revalidated = 0
+
+    def entries(self) -> dict:
+        """
+        Returns the genres, professions and health conditions known by the model.
+        """
+        with self._lock:
+            cached = self._entries
+            if cached and time.monotonic() - cached[0] < self.entries_ttl:
+                self.entries_hits += 1
+                return cached[2]
+
+        headers = {"If-None-Match": cached[1]} if cached and cached[1] else {}
+        try:
+            response = self.request("GET", "/entries", headers=headers)
+            if response.status_code == 304:
+                etag, entries = cached[1:]
+            else:
+                etag, entries = response.headers.get("ETag"), response.json()
+        except requests.RequestException:
+            # Outdated entries are better than none
+            with self._lock:
+                if cached is None:
+                    raise
+                self.entries_hits += 1
+                return cached[2]
+
+        with self._lock:
+            if response.status_code == 304:
+                self.entries_revalidated += 1
+            self._entries = (time.monotonic(), etag, entries)
+
+        return entries
+
+    def predict(self, data: dict) -> dict:
+        """
+        Returns the eligibility score of a donor (see the API `/input`).
+        """
+        return self.request("POST", "/input", json=data).json()
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        self._check_circuit()
+
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, self.base_url + path, timeout=self.timeout, **kwargs
+            )
+            response.raise_for_status()
+        except requests.RequestException as err:
+            self._record(path, start, err)
+            raise
+
+        self._record(path, start)
+
+        return response
+
+    def _check_circuit(self):
+        with self._lock:
+            if self._failures < self.max_failures:
+                return
+
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.base_url} is unavailable")
+
+            # Only this call checks whether the API is back
+            self._opened_at = time.monotonic()
+
+    def _record(self, path: str, start: float, error=None):
+        duration = time.perf_counter() - start
+
+        with self._lock:
+            self.calls += 1
+            self._latencies[path].append(duration)
+            if error is None:
+                self._failures = 0
+                return
+
+            self.errors += 1
+            # A refused request (eg. an invalid input) is not an unavailable API
+            if error.response is not None and error.response.status_code < 500:
+                return
+            self._failures += 1
+            if self._failures >= self.max_failures:
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = {
+                path: dict(
+                    zip(
+                        ["p50", "p90", "p99"],
+                        np.percentile(list(durations), [50, 90, 99]).round(4).tolist(),
+                    )
+                )
+                for path, durations in self._latencies.items()
+                if durations
+            }
+
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "rejected": self.rejected,
+                "entries_hits": self.entries_hits,
+                "entries_revalidated": self.entries_revalidated,
+                "circuit": "open" if self._failures >= self.max_failures else "closed",
+                "latency_seconds": latencies,
+            }
@@ -0,0 +1,64 @@
+import collections
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+__all__ = ["JobQueue"]
+
+
+class JobQueue:
+    """
+    Runs the heavy computations in a pool of threads, so that the requests
+    answer without waiting for them.
+
+    A job is identified by a key: while it runs (and once done, among the
+    last `max_done` jobs), the same key gives the same job, so that the
+    concurrent viewers share a single computation. A failed job is run
+    again at the next submission.
+    """
+
+    def __init__(self, workers: int = 2, max_done: int = 32):
+        self.max_done = max_done
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="job")
+
+        # Key -> future, the least recently submitted first
+        self._jobs = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.shared = 0
+
+    def submit(self, key, function, *args) -> Future:
+        with self._lock:
+            future = self._jobs.get(key)
+            if future is not None and not (future.done() and future.exception()):
+                self._jobs.move_to_end(key)
+                self.shared += 1
+                return future
+
+            future = self._executor.submit(function, *args)
+            self._jobs[key] = future
+            self.submitted += 1
+
+            # Forget the oldest done jobs
+            done = [x for x, job in self._jobs.items() if job.done()]
+            for x in done[: max(len(done) - self.max_done, 0)]:
+                del self._jobs[x]
+
+            return future
+
+    def get(self, key) -> Future | None:
+        """
+        Returns the job of the key, without submitting it again if it failed
+        (None if unknown or forgotten).
+        """
+        with self._lock:
+            return self._jobs.get(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "shared": self.shared,
+                "running": sum(not job.done() for job in self._jobs.values()),
+                "done": sum(job.done() for job in self._jobs.values()),
+            }
@@ -0,0 +1,157 @@
+import hashlib
+import os
+import pathlib
+import pickle
+import tempfile
+import threading
+
+import pandas as pd
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+
+__all__ = ["ProfileStore", "fit_profile"]
+
+
+def fit_profile(
+    df_profiling: pd.DataFrame, paired_with: str, minibatch_size: int | None = None
+) -> dict:
+    """
+    Clusters the eligible donors by age, gender and the paired column, and
+    projects them on the two first principal components.
+
+    Returns the fitted models, the encoded donors with their cluster and
+    coordinates (PCA1, PCA2), and the insights of the ideal donor. Above
+    `minibatch_size` donors, `MiniBatchKMeans` and a randomized PCA are used.
+    """
+    df_profiling = df_profiling.copy()
+    large = minibatch_size is not None and len(df_profiling) > minibatch_size
+
+    # Encoding categorical features
+    gender_le = LabelEncoder()
+    paired_with_le = LabelEncoder()
+    df_profiling["Genre"] = gender_le.fit_transform(df_profiling["Genre"])
+    df_profiling[paired_with] = paired_with_le.fit_transform(df_profiling[paired_with])
+
+    # Standardizing data
+    scaler = StandardScaler()
+    df_scaled = scaler.fit_transform(df_profiling)
+
+    # Apply K-Means clustering
+    n_clusters = len(df_profiling.columns)
+    if large:
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42)
+    else:
+        kmeans = KMeans(n_clusters=n_clusters, random_state=42)
+    df_profiling["Cluster"] = kmeans.fit_predict(df_scaled)
+
+    # Apply PCA for visualization
+    if large:
+        pca = PCA(n_components=2, svd_solver="randomized", random_state=42)
+    else:
+        pca = PCA(n_components=2)
+    df_pca = pca.fit_transform(df_scaled)
+    df_profiling["PCA1"] = df_pca[:, 0]
+    df_profiling["PCA2"] = df_pca[:, 1]
+
+    # Generate insights into the characteristics of the ideal blood donor
+    ideal_donor = df_profiling[
+        df_profiling["Cluster"] == df_profiling["Cluster"].mode()[0]
+    ]
+    insights = [
+        round(ideal_donor["Age"].mean(), 1),
+        gender_le.inverse_transform([ideal_donor["Genre"].mode()[0]])[0],
+        paired_with_le.inverse_transform([ideal_donor[paired_with].mode()[0]])[0],
+    ]
+
+    return {
+        "models": {
+            "gender_encoder": gender_le,
+            "paired_with_encoder": paired_with_le,
+            "scaler": scaler,
+            "kmeans": kmeans,
+            "pca": pca,
+        },
+        "profiling": df_profiling,
+        "insights": insights,
+    }
+
+
+class ProfileStore:
+    """
+    Fitted donor profiles (see `fit_profile`), by version of the dataset.
+
+    A profile is fitted once, then kept in memory. When a directory is
+    given, the profiles are also stored there, so that they are reused by
+    the other processes and after a restart. The profiles of the previous
+    versions of the dataset are then removed.
+    """
+
+    def __init__(self, directory=None, minibatch_size: int | None = None):
+        self.directory = pathlib.Path(directory) if directory else None
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self.minibatch_size = minibatch_size
+
+        self._profiles = {}
+        # Key -> lock of its fit, while it is not fitted
+        self._fit_locks = {}
+        self._lock = threading.Lock()
+
+    def make_key(self, version: str, paired_with: str) -> str:
+        digest = hashlib.sha256(repr((paired_with, self.minibatch_size)).encode())
+
+        return f"{version}-{digest.hexdigest()[:16]}"
+
+    def get_or_fit(self, version: str, paired_with: str, df_profiling) -> dict:
+        """
+        Returns the profile of the dataset version, fitted on the donors
+        returned by `df_profiling()` if not yet stored.
+        """
+        key = self.make_key(version, paired_with)
+        with self._lock:
+            if key in self._profiles:
+                return self._profiles[key]
+            fit_lock = self._fit_locks.setdefault(key, threading.Lock())
+
+        # Only one fit of a profile at once, while the others are fitted or
+        # looked up in parallel
+        with fit_lock:
+            with self._lock:
+                if key in self._profiles:
+                    return self._profiles[key]
+
+            profile = self._read(key)
+            if profile is None:
+                profile = fit_profile(df_profiling(), paired_with, self.minibatch_size)
+                self._write(key, version, profile)
+
+            with self._lock:
+                self._profiles[key] = profile
+                del self._fit_locks[key]
+
+            return profile
+
+    def _read(self, key: str) -> dict | None:
+        if not self.directory:
+            return None
+
+        try:
+            return pickle.loads((self.directory / f"{key}.pkl").read_bytes())
+        except (OSError, pickle.UnpicklingError):
+            return None
+
+    def _write(self, key: str, version: str, profile: dict):
+        if not self.directory:
+            return
+
+        # Write then rename, so that the other processes never read a partial file
+        with tempfile.NamedTemporaryFile(dir=self.directory, delete=False) as f:
+            pickle.dump(profile, f)
+        os.replace(f.name, self.directory / f"{key}.pkl")
+
+        # The profiles of the other versions are not used anymore
+        for path in self.directory.glob("*.pkl"):
+            if not path.name.startswith(f"{version}-"):
+                path.unlink(missing_ok=True)
@@ -2,14 +2,17 @@ from dash.dependencies import Input, Output, State
 from dash import dcc, html
 import dash
 import dash_bootstrap_components as dbc
-import pandas as pd
+import flask
+import hashlib
+import hmac
 import pathlib
 import logging
-import requests
+import threading
+import time
 
 import config
 import preprocess
-from dashboard import Dashboard
+from dashboard import Dashboard, FigureCache, JobQueue, PredictionClient, ProfileStore
 
 
 # Whether if we should preprocess the data after a hot reload
@@ -21,8 +24,12 @@ logger = logging.getLogger(__name__)
 
 
 # Check if the data are already preprocessed.
+# NB: Large datasets are only saved as Arrow file (see `preprocess.stream`).
 if REALTIME or not (
-    pathlib.Path(config.PREPROCESSED_DATASET_FILE).exists()
+    (
+        pathlib.Path(config.PREPROCESSED_DATASET_FILE).exists()
+        or preprocess.dataset.get_cache_file(config.PREPROCESSED_DATASET_FILE).exists()
+    )
     and pathlib.Path(config.PREPROCESSED_GEO_DATASET_FILE).exists()
 ):
     logger.info("Preprocessing of the dataset...")
@@ -31,15 +38,178 @@ if REALTIME or not (
         config.PREPROCESSED_DATASET_FILE,
         config.RAW_GEO_DATASET_FILE,
         config.PREPROCESSED_GEO_DATASET_FILE,
+        reference_date=config.REFERENCE_DATE,
+        nltk_data_dir=config.NLTK_DATA_DIR,
+        geo_tolerance=config.GEO_SIMPLIFY_TOLERANCE,
+        geo_precision=config.GEO_PRECISION,
+        incremental=config.INCREMENTAL_PREPROCESS,
+        chunk_size=config.PREPROCESS_CHUNK_SIZE,
+        workers=config.PREPROCESS_WORKERS,
     )
 else:
     logger.info("Loading of the dataset...")
-    dataframe = pd.read_excel(config.PREPROCESSED_DATASET_FILE)
+    dataframe = preprocess.load_dataset(config.PREPROCESSED_DATASET_FILE)
     logger.info("Dataset loaded!")
 
+# The files saved last by the preprocessing: the cube (after the dataset), then
+# the GeoJSON. They change once the whole dataset is saved again (see
+# `watch_dataset`).
+watched_files = [
+    preprocess.dataset.get_cube_file(config.PREPROCESSED_DATASET_FILE),
+    pathlib.Path(config.PREPROCESSED_GEO_DATASET_FILE),
+]
+
+# Shared by the successive dashboards (see `reload_dashboard`), since they are
+# keyed by the version of the dataset
+figure_cache = FigureCache(
+    max_bytes=config.FIGURE_CACHE_MAX_BYTES,
+    directory=config.FIGURE_CACHE_DIR,
+)
+profiles = ProfileStore(
+    directory=config.PROFILING_MODELS_DIR,
+    minibatch_size=config.PROFILING_MINIBATCH_SIZE,
+)
+
+
+def load_geojson() -> tuple[bytes, str]:
+    """
+    Returns the GeoJSON of the map, with its hash.
+    """
+    data = pathlib.Path(config.PREPROCESSED_GEO_DATASET_FILE).read_bytes()
+
+    return data, hashlib.sha256(data).hexdigest()[:16]
+
+
+def make_dashboard(dataframe, geo: tuple[bytes, str]) -> Dashboard:
+    # Compact dtypes (categoricals, small integers), lighter and faster to group by
+    dataframe = preprocess.dataset.apply_schema(dataframe)
+
+    # Counts of the year-filtered figures, built once if not up to date
+    cube = preprocess.cube.load_cube(config.PREPROCESSED_DATASET_FILE)
+    if cube is None:
+        cube = preprocess.cube.build_cube(dataframe)
+        preprocess.cube.save_cube(cube, config.PREPROCESSED_DATASET_FILE)
+
+    return Dashboard(
+        dataframe,
+        cache=figure_cache,
+        geojson=f"{config.GEOJSON_ROUTE}?v={geo[1]}",
+        cube=cube,
+        profiles=profiles,
+    )
+
+
+def get_mtimes() -> tuple[int | None, ...]:
+    """
+    Returns the modification times of the watched files (None if missing).
+    """
+    mtimes = []
+    for path in watched_files:
+        try:
+            mtimes.append(path.stat().st_mtime_ns)
+        except FileNotFoundError:
+            mtimes.append(None)
+
+    return tuple(mtimes)
+
+
+# The GeoJSON is loaded once (and when reloaded), and downloaded by the browser
+# apart from the figures.
+# NB: Its hash is in the URL, so that it can be cached until it changes.
+geo = load_geojson()
 
 # Initialize the dashboard
-dashboard = Dashboard(dataframe)
+dashboard = make_dashboard(dataframe, geo)
+# NB: Only kept by the dashboard, so that a reload frees it
+del dataframe
+dataset_mtimes = get_mtimes()
+
+# Heavy computations, run in the background
+jobs = JobQueue(workers=config.BACKGROUND_WORKERS)
+
+
+def get_dashboard() -> Dashboard:
+    """
+    Returns the served dashboard.
+
+    NB: A callback which uses it more than once should get it once, so that a
+    reload doesn't change it meanwhile.
+    """
+    return dashboard
+
+
+def reload_dashboard() -> str:
+    """
+    Loads the preprocessed dataset again, then swaps the dashboard with the
+    served one if its version changed. The callbacks being run finish with the
+    previous one.
+
+    Returns the version of the served dataset.
+    """
+    global dashboard, geo
+
+    logger.info("Reloading of the dataset...")
+    try:
+        new_geo = load_geojson()
+        new_dashboard = make_dashboard(
+            preprocess.load_dataset(config.PREPROCESSED_DATASET_FILE), new_geo
+        )
+    except Exception:
+        # The previous dataset is still served
+        logger.exception("Unable to reload the dataset")
+        raise
+
+    if new_dashboard.version != dashboard.version or new_geo[1] != geo[1]:
+        geo, dashboard = new_geo, new_dashboard
+        logger.info(f"Dataset {dashboard.version} loaded!")
+
+    return dashboard.version
+
+
+def submit_reload():
+    """
+    Submits the reload of the dataset, once for a given save of it.
+    """
+    return jobs.submit(("reload_dataset", get_mtimes()), reload_dashboard)
+
+
+def watch_dataset():
+    """
+    Reloads the dataset whenever the preprocessing saves it again (eg.
+    `python -m preprocess`), every `DATASET_WATCH_INTERVAL` seconds.
+    """
+    last_mtimes = dataset_mtimes
+    while True:
+        time.sleep(config.DATASET_WATCH_INTERVAL)
+        # NB: Once the cube and the GeoJSON are both saved again, the second
+        # change reloads the dataset again, with both.
+        mtimes = get_mtimes()
+        if None not in mtimes and mtimes != last_mtimes:
+            last_mtimes = mtimes
+            submit_reload()
+
+
+# NB: Each worker watches the dataset, since it serves its own dashboard
+if config.DATASET_WATCH_INTERVAL:
+    threading.Thread(target=watch_dataset, name="dataset-watcher", daemon=True).start()
+
+# Client of the eligibility prediction API, shared by the callbacks
+prediction_api = (
+    PredictionClient(
+        config.ELIGIBILITY_PREDICTION_API,
+        timeout=(
+            config.PREDICTION_API_CONNECT_TIMEOUT,
+            config.PREDICTION_API_READ_TIMEOUT,
+        ),
+        retries=config.PREDICTION_API_RETRIES,
+        pool_size=config.PREDICTION_API_POOL_SIZE,
+        max_failures=config.PREDICTION_API_MAX_FAILURES,
+        reset_timeout=config.PREDICTION_API_RESET_TIMEOUT,
+        entries_ttl=config.PREDICTION_API_ENTRIES_TTL,
+    )
+    if config.ELIGIBILITY_PREDICTION_API
+    else None
+)
 
 # Initialize Dash app
 app = dash.Dash(
@@ -51,6 +221,63 @@ app = dash.Dash(
 # Useful when deploying with gunicorn
 server = app.server
 
+
+# Statistics of the figure cache (of the worker which answers)
+@server.route("/cache-stats")
+def cache_stats():
+    return dashboard.cache.stats()
+
+
+# Statistics of the background jobs (of the worker which answers)
+@server.route("/job-stats")
+def job_stats():
+    return jobs.stats()
+
+
+# Statistics of the calls to the prediction API (of the worker which answers)
+@server.route("/api-stats")
+def api_stats():
+    return prediction_api.stats() if prediction_api else {}
+
+
+# Version of the served dataset (of the worker which answers), which keys its
+# cached figures and profiling models
+@server.route("/dataset-version")
+def dataset_version():
+    return {"version": dashboard.version}
+
+
+# Reloads the dataset in the background (of the worker which answers), without
+# waiting for the preprocessed files to be checked (see `watch_dataset`).
+# Only with the `RELOAD_TOKEN` (Authorization: Bearer <token>).
+@server.route("/reload", methods=["POST"])
+def reload_dataset():
+    # Disabled unless a token is configured
+    if not config.RELOAD_TOKEN:
+        flask.abort(404)
+
+    authorization = flask.request.headers.get("Authorization", "")
+    if not hmac.compare_digest(
+        authorization.encode(), f"Bearer {config.RELOAD_TOKEN}".encode()
+    ):
+        flask.abort(401)
+
+    submit_reload()
+
+    return {"version": dashboard.version}, 202
+
+
+@server.route(config.GEOJSON_ROUTE)
+def geojson_asset():
+    geojson, geojson_etag = geo
+    response = flask.Response(geojson, mimetype="application/geo+json")
+    response.set_etag(geojson_etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 365 * 24 * 3600
+
+    return response.make_conditional(flask.request)
+
+
 # Sidebar
 offcanvas = html.Div(
     [
@@ -207,6 +434,8 @@ content = dbc.Container(
             type="grow",
             color="primary",
             fullscreen=True,
+            # Only while the page itself loads, the figures having their own spinner
+            target_components={"page-content": "children"},
         )
     ],
     class_name="my-5",
@@ -227,8 +456,18 @@ def toggle_offcanvas(n1, is_open):
     return is_open
 
 
+def lazy_graph(graph_id: str):
+    """
+    Returns an empty graph, with a spinner until its callback computes the figure,
+    so that the page is shown without waiting for its figures.
+    """
+    return dcc.Loading(dcc.Graph(id=graph_id), type="circle")
+
+
 @app.callback(Output("page-content", "children"), [Input("url", "pathname")])
 def render_page_content(pathname):
+    dashboard = get_dashboard()
+
     if pathname == "/":
         with open("USER-MANUAL.md") as f:
             return dcc.Markdown(f.read())
@@ -241,17 +480,12 @@ def render_page_content(pathname):
                 ),
                 html.Div(
                     [
-                        dcc.Graph(
-                            id="donor-map", figure=dashboard.map_donor_distribution()
-                        ),
+                        lazy_graph("donor-map"),
                     ],
                 ),
                 html.Div(
                     [
-                        dcc.Graph(
-                            id="donor-map-2",
-                            figure=dashboard.map_donor_distribution(map_view=False),
-                        ),
+                        lazy_graph("donor-map-2"),
                     ],
                 ),
             ]
@@ -264,10 +498,7 @@ def render_page_content(pathname):
                     style={"textAlign": "center"},
                 ),
                 # Pie Chart - Overall Eligibility
-                dcc.Graph(
-                    id="eligibility-pie",
-                    figure=dashboard.health_conditions_and_eligibility(),
-                ),
+                lazy_graph("eligibility-pie"),
                 # Select for selecting health condition
                 dbc.Select(
                     id="eligibility-condition-select",
@@ -278,21 +509,14 @@ def render_page_content(pathname):
                     value=dashboard.health_conditions[0],  # Default selection
                 ),
                 # Bar Chart - Health Condition Impact
-                dcc.Graph(id="eligibility-condition-bar"),
+                lazy_graph("eligibility-condition-bar"),
                 # Bar Chart - Overall Health Condition Impact
-                dcc.Graph(
-                    id="eligibility-condition-2-bar",
-                    figure=dashboard.health_conditions_and_eligibility("all"),
-                ),
+                lazy_graph("eligibility-condition-2-bar"),
             ]
         )
     elif pathname == "/donor-profiling":
-        religion_figure, religion_insights = dashboard.profiling_ideal_donors(
-            paired_with="Religion"
-        )
-        profession_figure, profession_insights = dashboard.profiling_ideal_donors(
-            paired_with="Profession"
-        )
+        # The clustering runs in the background, and the page is filled once done
+        version = submit_profiling()
 
         return html.Div(
             [
@@ -300,55 +524,19 @@ def render_page_content(pathname):
                     "Blood Donor Profiling Using Clustering",
                     style={"textAlign": "center"},
                 ),
-                html.Div(
-                    [
-                        html.H3(
-                            "Gender - Religion",
-                            style={"textAlign": "center"},
-                        ),
-                        # Scatter Plot - PCA Visualization of Clusters
-                        dcc.Graph(
-                            id="profiling-cluster-scatter",
-                            figure=religion_figure,
-                        ),
-                        # Display Ideal Donor Insights
-                        html.H4("Ideal Donor Insights:"),
-                        html.Ul(
-                            [
-                                html.Li(f"Average Age: {religion_insights[0]}"),
-                                html.Li(f"Most Common Gender: {religion_insights[1]}"),
-                                html.Li(
-                                    f"Most Common Religion: {religion_insights[2]}"
-                                ),
-                            ]
-                        ),
-                    ]
+                dcc.Store(id="profiling-version", data=version),
+                dcc.Interval(
+                    id="profiling-interval", interval=config.PROFILING_POLL_INTERVAL
                 ),
                 html.Div(
-                    [
-                        html.H3(
-                            "Gender - Profession",
-                            style={"textAlign": "center"},
-                        ),
-                        # Scatter Plot - PCA Visualization of Clusters
-                        dcc.Graph(
-                            id="profiling-cluster-scatter-2",
-                            figure=profession_figure,
-                        ),
-                        # Display Ideal Donor Insights
-                        html.H4("Ideal Donor Insights:"),
-                        html.Ul(
-                            [
-                                html.Li(f"Average Age: {profession_insights[0]}"),
-                                html.Li(
-                                    f"Most Common Gender: {profession_insights[1]}"
-                                ),
-                                html.Li(
-                                    f"Most Common Profession: {profession_insights[2]}"
-                                ),
-                            ]
-                        ),
-                    ]
+                    html.Div(
+                        [
+                            dbc.Spinner(color="primary"),
+                            html.P("Clustering of the donors...", className="mt-3"),
+                        ],
+                        className="text-center my-5",
+                    ),
+                    id="profiling-content",
                 ),
             ],
         )
@@ -367,13 +555,13 @@ def render_page_content(pathname):
                     value=max(dashboard.years),  # Default to most recent year
                 ),
                 # Line Chart - Donations Over Time
-                dcc.Graph(id="campaign-donation-trend"),
+                lazy_graph("campaign-donation-trend"),
                 # Bar Chart - Donations by Gender
-                dcc.Graph(id="campaign-donation-gender"),
+                lazy_graph("campaign-donation-gender"),
                 # Bar Chart - Donations by Education Level
-                dcc.Graph(id="campaign-donation-education"),
+                lazy_graph("campaign-donation-education"),
                 # Bar Chart - Donations by Profession
-                dcc.Graph(id="campaign-donation-profession"),
+                lazy_graph("campaign-donation-profession"),
             ]
         )
     elif pathname == "/donor-retention":
@@ -389,15 +577,15 @@ def render_page_content(pathname):
                     value=max(dashboard.years),  # Default to most recent year
                 ),
                 # Pie Chart - Repeat Donation Frequency
-                dcc.Graph(id="retention-donation"),
+                lazy_graph("retention-donation"),
                 # Bar Chart - Retention by Age Group
-                dcc.Graph(id="retention-age"),
+                lazy_graph("retention-age"),
                 # Bar Chart - Retention by Genre Group
-                dcc.Graph(id="retention-genre"),
+                lazy_graph("retention-genre"),
                 # Bar Chart - Retention by Profession
-                dcc.Graph(id="retention-profession"),
+                lazy_graph("retention-profession"),
                 # Bar Chart - Retention by Region
-                dcc.Graph(id="retention-region"),
+                lazy_graph("retention-region"),
             ]
         )
     elif pathname == "/feedback":
@@ -423,17 +611,17 @@ def render_page_content(pathname):
                     value=groups[0],  # Default to first
                 ),
                 # Pie Chart - Overall feedback analysis
-                dcc.Graph(id="feedback-donation"),
+                lazy_graph("feedback-donation"),
                 # Bar Chart - Feedback analysis per group
-                dcc.Graph(id="feedback-group"),
+                lazy_graph("feedback-group"),
             ]
         )
     elif pathname == "/eligibility-prediction":
         try:
-            if not config.ELIGIBILITY_PREDICTION_API:
+            if not prediction_api:
                 raise Exception("Eligibility prediction API not set!")
 
-            data = requests.get(config.ELIGIBILITY_PREDICTION_API + "/entries").json()
+            data = prediction_api.entries()
         except Exception as err:
             logging.error(f"API error: {err}")
 
@@ -509,6 +697,31 @@ def render_page_content(pathname):
     )
 
 
+# NB: The figures of a page are computed in parallel, each one by its own request,
+# triggered when its graph is added to the page.
+@app.callback(Output("donor-map", "figure"), [Input("donor-map", "id")])
+def update_donor_map(_):
+    return dashboard.map_donor_distribution()
+
+
+@app.callback(Output("donor-map-2", "figure"), [Input("donor-map-2", "id")])
+def update_donor_bar(_):
+    return dashboard.map_donor_distribution(map_view=False)
+
+
+@app.callback(Output("eligibility-pie", "figure"), [Input("eligibility-pie", "id")])
+def update_eligibility_pie(_):
+    return dashboard.health_conditions_and_eligibility()
+
+
+@app.callback(
+    Output("eligibility-condition-2-bar", "figure"),
+    [Input("eligibility-condition-2-bar", "id")],
+)
+def update_eligibility_overall_chart(_):
+    return dashboard.health_conditions_and_eligibility("all")
+
+
 @app.callback(
     Output("eligibility-condition-bar", "figure"),
     Input("eligibility-condition-select", "value"),
@@ -517,6 +730,114 @@ def update_eligibiliy_chart(condition: str):
     return dashboard.health_conditions_and_eligibility(condition)
 
 
+PROFILING_PAIRED_WITH = ["Religion", "Profession"]
+
+
+def get_profiling_key(paired_with: str, version: str) -> tuple:
+    return ("profiling_ideal_donors", paired_with, version)
+
+
+def submit_profiling() -> str:
+    """
+    Submits the clustering of the donors, shared by the concurrent viewers, and
+    returns the version of the dataset it is run on.
+    """
+    dashboard = get_dashboard()
+    for paired_with in PROFILING_PAIRED_WITH:
+        jobs.submit(
+            get_profiling_key(paired_with, dashboard.version),
+            dashboard.profiling_ideal_donors,
+            paired_with,
+        )
+
+    return dashboard.version
+
+
+@app.callback(
+    [
+        Output("profiling-content", "children"),
+        Output("profiling-interval", "disabled"),
+    ],
+    [Input("profiling-interval", "n_intervals")],
+    [State("profiling-version", "data")],
+)
+def update_profiling_page(n_intervals, version: str):
+    # Only looks the jobs up: a failed one is shown, not run again at each tick
+    futures = [
+        jobs.get(get_profiling_key(paired_with, version))
+        for paired_with in PROFILING_PAIRED_WITH
+    ]
+    if None in futures:
+        logging.error(f"Profiling error: no job for the version {version}")
+
+        return (
+            dbc.Alert(
+                "Error: The donor profiling is no longer available, reload the page",
+                color="danger",
+            ),
+            True,
+        )
+    if not all(future.done() for future in futures):
+        return dash.no_update, False
+
+    try:
+        results = [future.result() for future in futures]
+    except Exception as err:
+        logging.error(f"Profiling error: {err}")
+
+        return dbc.Alert("Error: Unable to profile the donors", color="danger"), True
+
+    religion_figure, religion_insights = results[0]
+    profession_figure, profession_insights = results[1]
+
+    return [
+        html.Div(
+            [
+                html.H3(
+                    "Gender - Religion",
+                    style={"textAlign": "center"},
+                ),
+                # Scatter Plot - PCA Visualization of Clusters
+                dcc.Graph(
+                    id="profiling-cluster-scatter",
+                    figure=religion_figure,
+                ),
+                # Display Ideal Donor Insights
+                html.H4("Ideal Donor Insights:"),
+                html.Ul(
+                    [
+                        html.Li(f"Average Age: {religion_insights[0]}"),
+                        html.Li(f"Most Common Gender: {religion_insights[1]}"),
+                        html.Li(f"Most Common Religion: {religion_insights[2]}"),
+                    ]
+                ),
+            ]
+        ),
+        html.Div(
+            [
+                html.H3(
+                    "Gender - Profession",
+                    style={"textAlign": "center"},
+                ),
+                # Scatter Plot - PCA Visualization of Clusters
+                dcc.Graph(
+                    id="profiling-cluster-scatter-2",
+                    figure=profession_figure,
+                ),
+                # Display Ideal Donor Insights
+                html.H4("Ideal Donor Insights:"),
+                html.Ul(
+                    [
+                        html.Li(f"Average Age: {profession_insights[0]}"),
+                        html.Li(f"Most Common Gender: {profession_insights[1]}"),
+                        html.Li(f"Most Common Profession: {profession_insights[2]}"),
+                    ]
+                ),
+            ]
+        ),
+    ], True
+
+
 @app.callback(
     [
         Output("campaign-donation-trend", "figure"),
@@ -574,15 +895,20 @@ def update_feedback_charts(year: str, group: str):
 def update_eligibility_predict_result(
     age: str, genre: str, profession: str, health_condition: str
 ):
-    data = requests.post(
-        config.ELIGIBILITY_PREDICTION_API + "/input",
-        json={
-            "age": age,
-            "genre": genre,
-            "professions": [profession] if profession else [],
-            "health_conditions": [health_condition] if health_condition else [],
-        },
-    ).json()
+    try:
+        data = prediction_api.predict(
+            {
+                "age": age,
+                "genre": genre,
+                "professions": [profession] if profession else [],
+                "health_conditions": [health_condition] if health_condition else [],
+            }
+        )
+    except Exception as err:
+        logging.error(f"API error: {err}")
+
+        return "Error: Unable to contact the API", "danger", 100
+
     score = int(data["score"] * 100)
     color = ["danger", "warning", "info", "primary", "success"][score // 25]
 
@@ -1,11 +1,25 @@
+import numpy as np
 import pandas as pd
 import pathlib
 import geopandas as gpd
-import json
 import re
 import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 
-from . import utils
+from . import cube, model, stream, utils
+from .dataset import (
+    FINGERPRINT_COLUMN,
+    fingerprint,
+    get_names_file,
+    get_store_file,
+    load_dataset,
+    load_rows,
+    normalize,
+    save_dataset,
+    save_rows,
+)
 
 
 # Configure logging
@@ -13,43 +27,61 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-__all__ = ["preprocess"]
+__all__ = ["preprocess", "load_dataset"]
 
 
-# Clean and prepare data for analysis and visualization.
-def preprocess(
-    dataset_file: str,
-    pre_dataset_file,
-    geodata_file: str,
-    pre_geodata_file,
-):
-    assert pathlib.Path(dataset_file).exists()
-    assert pathlib.Path(geodata_file).exists()
+# Version of the cleaning, to bump when it changes the cleaned rows
+CLEANING_VERSION = "1"
 
-    # Create output folder if not exists
-    pathlib.Path(pre_dataset_file).parent.mkdir(parents=True, exist_ok=True)
-    pathlib.Path(pre_geodata_file).parent.mkdir(parents=True, exist_ok=True)
 
-    # Load the sheets
-    logger.info("Loading of dataset...")
-    dataframe_a = pd.read_excel(dataset_file, sheet_name=0)
-    dataframe_b = pd.read_excel(dataset_file, sheet_name=2)
-    dataframe_c = pd.read_excel(dataset_file, sheet_name=1)
-    logger.info("Dataset loaded!")
+# Sheets of the dataset, in the order of their concatenation
+SHEETS = [0, 2, 1]
 
-    logger.info("Data cleaning...")
 
+def prepare_sheet(sheet: int, dataframe: pd.DataFrame) -> pd.DataFrame:
+    """
+    Gives to the rows of a sheet the same column names as the other sheets.
+    """
     # Clean dataframe column names
-    dataframe_a.rename(columns=lambda x: x.strip(), inplace=True)
-    dataframe_b.rename(columns=lambda x: x.replace("_", " ").strip(), inplace=True)
-    dataframe_c["Sexe"] = dataframe_c["Sexe"].map({"F": "Femme", "M": "Homme"})
-    dataframe_c.rename(
-        columns={"Horodateur": "Date de remplissage de la fiche", "Sexe": "Genre"},
-        inplace=True,
+    if sheet == 0:
+        return dataframe.rename(columns=lambda x: x.strip())
+    elif sheet == 2:
+        return dataframe.rename(columns=lambda x: x.replace("_", " ").strip())
+
+    dataframe = dataframe.assign(
+        Sexe=dataframe["Sexe"].map({"F": "Femme", "M": "Homme"})
     )
+    return dataframe.rename(
+        columns={"Horodateur": "Date de remplissage de la fiche", "Sexe": "Genre"}
+    )
+
+
+def load_sheets(dataset_file) -> pd.DataFrame:
+    """
+    Returns the rows of the three sheets, with the same column names, as strings.
+    """
+    dataframes = [
+        prepare_sheet(sheet, pd.read_excel(dataset_file, sheet_name=sheet))
+        for sheet in SHEETS
+    ]
 
     # Concat data
-    dataframe = pd.concat([dataframe_a, dataframe_b, dataframe_c]).astype(str)
+    return pd.concat(dataframes).astype(str)
+
+
+def clean(
+    dataframe: pd.DataFrame,
+    matcher: utils.ArrondissementMatcher,
+    analyzer: utils.SentimentAnalyzer,
+    reference_date=None,
+    names: utils.NameCleaner | None = None,
+) -> pd.DataFrame:
+    """
+    Cleans the raw rows, each one independently of the others.
+    """
+    if names is None:
+        names = utils.NameCleaner()
+    dataframe = dataframe.copy()
 
     # Clean names
     name_columns = [
@@ -61,27 +93,23 @@ def preprocess(
         "Profession",
         "Niveau d'etude",
     ]
-    dataframe[name_columns] = dataframe[name_columns].map(utils.clean_name)
+    dataframe[name_columns] = names.clean(dataframe[name_columns])
 
     # Clean dates.
     date_columns = ["Date de remplissage de la fiche", "Date de naissance"]
-    dataframe[date_columns] = dataframe[date_columns].map(utils.clean_date)
-    dataframe["Date de remplissage de la fiche"] = pd.to_datetime(
-        dataframe["Date de remplissage de la fiche"]
-    )
-    dataframe["Date de naissance"] = pd.to_datetime(dataframe["Date de naissance"])
+    for column in date_columns:
+        dataframe[column] = utils.clean_dates(dataframe[column])
 
     # Adding of the missing age infos.
-    computed_ages = (
-        dataframe["Date de naissance"]
-        .map(lambda x: utils.calculate_age(x) if pd.notnull(x) else 0)
-        .astype(float)
-    )
-    dataframe["Age"] = (
-        dataframe["Age"].map(lambda x: int(x) if x.isdigit() else 0).astype(float)
-        + computed_ages
-    )
-    dataframe["Age"] = dataframe["Age"].map(lambda x: x if x else None)
+    # NB: The ages are computed at the reference date, today by default.
+    computed_ages = utils.calculate_ages(
+        dataframe["Date de naissance"], reference_date
+    ).fillna(0)
+    given_ages = pd.to_numeric(
+        dataframe["Age"].where(dataframe["Age"].str.isdigit())
+    ).fillna(0)
+    dataframe["Age"] = given_ages + computed_ages
+    dataframe["Age"] = dataframe["Age"].where(dataframe["Age"] != 0)
 
     # Precompute date infos.
     dataframe["Year"] = dataframe["Date de remplissage de la fiche"].dt.year
@@ -117,36 +145,312 @@ def preprocess(
     # Update column names to reflect criteria description
     dataframe.rename(columns=lambda x: re.sub(r".*\[|\]", "", x).strip(), inplace=True)
 
+    # Attempt to fix the arrondissement names.
+    dataframe["Arrondissement de résidence"] = matcher.match(
+        dataframe["Arrondissement de résidence"]
+    )["match"]
+
+    # Applying sentiment analysis on feedback
+    dataframe["Health feedback analysis"] = analyzer.analyze_all(
+        dataframe["Si autres raison préciser"]
+    )
+
+    return dataframe
+
+
+# State of a worker process (see `clean_chunks`)
+worker = {}
+
+
+def init_worker(matcher, analyzer, reference_date, names):
+    worker.update(
+        matcher=matcher, analyzer=analyzer, reference_date=reference_date, names=names
+    )
+
+
+def clean_in_worker(dataframe: pd.DataFrame):
+    matcher, names = worker["matcher"], worker["names"]
+    dataframe = clean(
+        dataframe, matcher, worker["analyzer"], worker["reference_date"], names
+    )
+
+    # The matches are sent back for the audit, and the names to be saved
+    return dataframe, matcher.matches, names.names
+
+
+def clean_chunks(
+    chunks,
+    matcher,
+    analyzer,
+    reference_date=None,
+    workers: int = 1,
+    names: utils.NameCleaner | None = None,
+):
+    """
+    Cleans the chunks of raw rows, and yields them in the same order.
+
+    With several workers, the chunks are cleaned in a process pool, a few
+    of them at once per worker, so that the memory used stays bounded.
+    """
+    if names is None:
+        names = utils.NameCleaner()
+    if workers <= 1:
+        for chunk in chunks:
+            yield clean(chunk, matcher, analyzer, reference_date, names)
+        return
+
+    with ProcessPoolExecutor(
+        workers,
+        initializer=init_worker,
+        initargs=(matcher, analyzer, reference_date, names),
+    ) as executor:
+        pending = deque()
+
+        def result():
+            chunk, matches, cleaned_names = pending.popleft().result()
+            matcher.matches.update(matches)
+            names.names.update(cleaned_names)
+            return chunk
+
+        for chunk in chunks:
+            pending.append(executor.submit(clean_in_worker, chunk))
+            if len(pending) >= 2 * workers:
+                yield result()
+
+        while pending:
+            yield result()
+
+
+def split(dataframe: pd.DataFrame, parts: int):
+    """
+    Yields the rows of the dataframe in (at most) the given number of parts.
+    """
+    size = max(1, -(-len(dataframe) // parts))
+    for start in range(0, len(dataframe), size):
+        yield dataframe.iloc[start : start + size]
+
+
+def preprocess_chunks(
+    chunks,
+    pre_dataset_file,
+    geo_names: list[str],
+    reference_date=None,
+    nltk_data_dir=None,
+    excel: bool = True,
+    workers: int = 1,
+    names: utils.NameCleaner | None = None,
+) -> set[str]:
+    """
+    Cleans the chunks of raw rows one after the other (or in parallel with
+    several workers), and saves them as they come. Returns the
+    arrondissements found.
+    """
+    matcher = utils.ArrondissementMatcher(geo_names)
+    analyzer = utils.SentimentAnalyzer(data_dir=nltk_data_dir)
+    arrondissements = set()
+    # Cube and eligibility model of the rows cleaned so far (merged chunk after chunk)
+    cubes = []
+    models = []
+
+    def cleaned_chunks():
+        for chunk in clean_chunks(
+            chunks, matcher, analyzer, reference_date, workers, names
+        ):
+            arrondissements.update(chunk["Arrondissement de résidence"].dropna())
+            cleaned = normalize(chunk, empty_as_float=False)
+            cubes.append(cube.build_cube(cleaned))
+            cubes[:] = [cube.merge_cubes(cubes)]
+            models.append(model.build_model(cleaned))
+            models[:] = [model.merge_models(models)]
+            yield chunk
+
+    rows = stream.write_dataset(cleaned_chunks(), pre_dataset_file, excel=excel)
+    logger.info(f"{rows} rows cleaned")
+    if cubes:
+        cube.save_cube(cubes[0], pre_dataset_file)
+        model.save_model(models[0], pre_dataset_file)
+
+    # Log the matches for auditing, the worst first
+    for value, match, score in matcher.audit().itertuples(index=False):
+        logger.info(f"Arrondissement {value!r} matched to {match!r} ({score:.2f})")
+
+    return arrondissements
+
+
+# Clean and prepare data for analysis and visualization.
+def preprocess(
+    dataset_file: str,
+    pre_dataset_file,
+    geodata_file: str,
+    pre_geodata_file,
+    reference_date=None,
+    nltk_data_dir=None,
+    geo_tolerance: float = 0.0005,
+    geo_precision: int = 5,
+    incremental: bool = False,
+    chunk_size: int | None = None,
+    workers: int = 1,
+):
+    """
+    Cleans the dataset and prepares the geo data.
+
+    In incremental mode, the cleaned rows are kept in a store next to the
+    preprocessed dataset, by fingerprint of their raw row, so that only the
+    new or modified rows are cleaned. The store is rebuilt (full rebuild)
+    when it is missing, or when the settings it was built with (reference
+    date, geo data, columns, cleaning version) have changed.
+
+    With a chunk size, the rows are read, cleaned and saved in chunks of
+    this size (streaming mode), so that the memory used stays bounded. All
+    the rows are then cleaned, the incremental mode being ignored.
+
+    With several workers, the rows are cleaned in parallel, in chunks (of
+    the chunk size, else a few per worker), in a process pool.
+
+    The cleaned names are kept in a dictionary next to the preprocessed
+    dataset, so that each distinct name is cleaned once across runs.
+    """
+    assert pathlib.Path(dataset_file).exists()
+    assert pathlib.Path(geodata_file).exists()
+
+    # Create output folder if not exists
+    pathlib.Path(pre_dataset_file).parent.mkdir(parents=True, exist_ok=True)
+    pathlib.Path(pre_geodata_file).parent.mkdir(parents=True, exist_ok=True)
+
+    # NB: The ages are computed at the reference date, today by default.
+    reference_date = pd.Timestamp(reference_date or datetime.today()).normalize()
+
+    # Geo data loading
+    gdf = gpd.read_file(geodata_file)
+
+    names_file = get_names_file(pre_dataset_file)
+    names = utils.NameCleaner.load(names_file)
+
+    if chunk_size:
+        logger.info(f"Streaming of the dataset, in chunks of {chunk_size} rows...")
+        chunks = stream.iter_sheets(dataset_file, chunk_size, SHEETS, prepare_sheet)
+        arrondissements = preprocess_chunks(
+            chunks,
+            pre_dataset_file,
+            gdf["ADM3_FR"].tolist(),
+            reference_date=reference_date,
+            nltk_data_dir=nltk_data_dir,
+            workers=workers,
+            names=names,
+        )
+        logger.info("Dataset cleaned and saved!")
+        dataframe = None
+    else:
+        dataframe = preprocess_rows(
+            dataset_file,
+            pre_dataset_file,
+            geodata_file,
+            gdf["ADM3_FR"].tolist(),
+            reference_date=reference_date,
+            nltk_data_dir=nltk_data_dir,
+            incremental=incremental,
+            workers=workers,
+            names=names,
+        )
+        arrondissements = dataframe["Arrondissement de résidence"].dropna().unique()
+    names.save(names_file)
+
     # Geo data preparation
+    # NB: Only the arrondissements of the dataset are kept, with a lighter
+    # geometry, since the whole file is sent to the browser.
     logger.info("Preprocess of the GEO data...")
-    gdf = gpd.read_file(geodata_file)
-    gdf.to_file(pre_geodata_file, driver="GeoJSON")
+    gdf = utils.compact_geodata(
+        gdf, arrondissements, tolerance=geo_tolerance, precision=geo_precision
+    )
+    gdf.to_file(pre_geodata_file, driver="GeoJSON", COORDINATE_PRECISION=geo_precision)
     logger.info("GEO data preproccessed!")
 
-    # Browse the map and apply text similarity to detect the best one
-    logger.info("Attempt to fix geo data in the dataset...")
-    # Load GeoJSON for mapping
-    with open(pre_geodata_file, "r", encoding="utf-8") as f:
-        geojson_data = json.load(f)
+    if dataframe is None:
+        # Memory-mapped, so not loaded in memory at once
+        dataframe = load_dataset(pre_dataset_file)
 
-    geo_arrs = [x["properties"]["ADM3_FR"] for x in geojson_data["features"]]
+    return dataframe
 
-    # Attempt to fix the arrondissement names.
-    dataframe["Arrondissement de résidence"] = dataframe[
-        "Arrondissement de résidence"
-    ].apply(lambda x: utils.fix_arrondissement(x, geo_arrs))
 
-    logger.info("Attempt to digitalize feedback using sentiment analysis...")
-    # Applying sentiment analysis on feedback
-    dataframe["Health feedback analysis"] = dataframe["Si autres raison préciser"].map(
-        utils.sentiment_analysis
-    )
+def preprocess_rows(
+    dataset_file,
+    pre_dataset_file,
+    geodata_file,
+    geo_names: list[str],
+    reference_date,
+    nltk_data_dir=None,
+    incremental: bool = False,
+    workers: int = 1,
+    names: utils.NameCleaner | None = None,
+) -> pd.DataFrame:
+    """
+    Cleans the rows of the dataset in memory, only the new or modified
+    ones in incremental mode, and saves them.
+    """
+    # Load the sheets
+    logger.info("Loading of dataset...")
+    raw_dataframe = load_sheets(dataset_file)
+    logger.info("Dataset loaded!")
+
+    # Everything which changes the cleaned rows, apart from the raw rows
+    settings = {
+        "cleaning_version": CLEANING_VERSION,
+        "reference_date": reference_date.date().isoformat(),
+        "geodata": fingerprint(geodata_file)[b"source_sha256"].decode(),
+        "columns": "|".join(raw_dataframe.columns),
+    }
+    fingerprints = pd.util.hash_pandas_object(raw_dataframe, index=False).to_numpy()
+
+    store_file = get_store_file(pre_dataset_file)
+    stored_rows = load_rows(store_file, settings) if incremental else None
+    # The duplicated rows are cleaned once
+    new = ~pd.Series(fingerprints).duplicated().to_numpy()
+    if stored_rows is None:
+        logger.info("Full rebuild of the dataset...")
+    else:
+        new &= ~np.isin(fingerprints, stored_rows[FINGERPRINT_COLUMN])
+    logger.info(f"{new.sum()} distinct rows to clean, out of {len(new)} rows")
+
+    if new.any():
+        logger.info("Data cleaning...")
+        # Browse the map and apply text similarity to detect the best one
+        matcher = utils.ArrondissementMatcher(geo_names)
+        analyzer = utils.SentimentAnalyzer(data_dir=nltk_data_dir)
+
+        chunks = split(raw_dataframe[new], 4 * workers if workers > 1 else 1)
+        new_rows = normalize(
+            pd.concat(
+                clean_chunks(chunks, matcher, analyzer, reference_date, workers, names)
+            )
+        )
+        new_rows[FINGERPRINT_COLUMN] = fingerprints[new]
+
+        # Log the matches for auditing, the worst first
+        for value, match, score in matcher.audit().itertuples(index=False):
+            logger.info(f"Arrondissement {value!r} matched to {match!r} ({score:.2f})")
+
+        if stored_rows is None:
+            stored_rows = new_rows
+        else:
+            stored_rows = pd.concat([stored_rows, new_rows], ignore_index=True)
 
+    # The cleaned rows in the order of the raw rows (the removed ones are dropped)
+    positions = pd.Index(stored_rows[FINGERPRINT_COLUMN]).get_indexer(fingerprints)
+    stored_rows = stored_rows.iloc[positions].reset_index(drop=True)
+    dataframe = normalize(stored_rows.drop(columns=FINGERPRINT_COLUMN))
     logger.info("Dataset cleaned!")
 
     # Save the preprocessed data
     logger.info("Saving of the dataset...")
     dataframe.to_excel(pre_dataset_file)
+    # Typed copy of the dataset, faster to load than the Excel file
+    save_dataset(dataframe, pre_dataset_file)
+    # Counts of the figures, for the dashboard
+    cube.save_cube(cube.build_cube(dataframe), pre_dataset_file)
+    # Eligibility model, for the API
+    model.save_model(model.build_model(dataframe), pre_dataset_file)
+    # Cleaned rows, for the next incremental preprocessing
+    save_rows(stored_rows, store_file, settings)
     logger.info("Dataset saved!")
 
     return dataframe
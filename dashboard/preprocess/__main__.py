@@ -0,0 +1,31 @@
+"""
+Preprocess the dataset, only the new or modified rows by default.
+
+Usage: python -m preprocess [--full]
+"""
+
+import argparse
+
+import config
+from . import preprocess
+
+
+parser = argparse.ArgumentParser(prog="python -m preprocess", description=__doc__)
+parser.add_argument(
+    "--full", action="store_true", help="clean all the rows again (full rebuild)"
+)
+args = parser.parse_args()
+
+preprocess(
+    config.RAW_DATASET_FILE,
+    config.PREPROCESSED_DATASET_FILE,
+    config.RAW_GEO_DATASET_FILE,
+    config.PREPROCESSED_GEO_DATASET_FILE,
+    reference_date=config.REFERENCE_DATE,
+    nltk_data_dir=config.NLTK_DATA_DIR,
+    geo_tolerance=config.GEO_SIMPLIFY_TOLERANCE,
+    geo_precision=config.GEO_PRECISION,
+    incremental=not args.full,
+    chunk_size=config.PREPROCESS_CHUNK_SIZE,
+    workers=config.PREPROCESS_WORKERS,
+)
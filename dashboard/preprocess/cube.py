@@ -0,0 +1,144 @@
+"""
+Aggregate cube of the dataset: the number of rows by year, month, retention
+and feedback, overall and for each value of a dimension (grouping sets), so
+that the year-filtered figures don't have to scan the rows.
+"""
+
+import logging
+
+import pandas as pd
+import pyarrow as pa
+
+from .dataset import (
+    apply_schema,
+    fingerprint,
+    get_cache_file,
+    get_cube_file,
+    is_fresh,
+    write_table,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+__all__ = ["build_cube", "merge_cubes", "save_cube", "load_cube"]
+
+
+# Version of the cube, to bump when its columns change
+CUBE_VERSION = "1"
+
+# Columns of every grouping set
+KEYS = [
+    "Year",
+    "Month",
+    "A-t-il (elle) déjà donné le sang",
+    "Health feedback analysis",
+]
+# Columns with a grouping set of their own
+DIMENSIONS = [
+    "Genre",
+    "Niveau d'etude",
+    "Profession",
+    "Age",
+    "Arrondissement de résidence",
+]
+# Grouping set without dimension
+TOTAL = "Total"
+DIMENSION_COLUMN = "Dimension"
+COUNT_COLUMN = "Count"
+
+
+def build_cube(dataframe: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns the cube of the dataset (or of a part of it, see `merge_cubes`).
+
+    Each row is a count, for the grouping set given by the dimension column
+    (the other dimensions being then missing). The missing values are
+    counted too, as the figures drop them on their own.
+    """
+    dataframe = apply_schema(dataframe[[*KEYS, *DIMENSIONS]])
+    # The missing dimensions of each part are typed like the others, so that
+    # the concatenation doesn't depend on all-NA columns
+    dtypes = {DIMENSION_COLUMN: object, **dataframe.dtypes.to_dict()}
+
+    parts = []
+    for dimension in [TOTAL, *DIMENSIONS]:
+        keys = KEYS if dimension == TOTAL else [*KEYS, dimension]
+        part = (
+            dataframe.groupby(keys, dropna=False, observed=True, sort=False)
+            .size()
+            .reset_index(name=COUNT_COLUMN)
+        )
+        part.insert(0, DIMENSION_COLUMN, dimension)
+        parts.append(
+            part.reindex(
+                columns=[DIMENSION_COLUMN, *KEYS, *DIMENSIONS, COUNT_COLUMN]
+            ).astype(dtypes)
+        )
+
+    cube = pd.concat(parts, ignore_index=True)
+    cube[DIMENSION_COLUMN] = pd.Categorical(
+        cube[DIMENSION_COLUMN], categories=[TOTAL, *DIMENSIONS]
+    )
+
+    return cube
+
+
+def merge_cubes(cubes: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Returns the cube of the whole dataset, from the cubes of its parts.
+    """
+    # NB: The categories of each part are merged by the concatenation. The
+    # all-NA columns of a part (eg. a dimension missing from its rows) are
+    # dropped, so that they don't change the dtypes, then typed again.
+    cube = pd.concat(
+        [x.dropna(axis=1, how="all") for x in cubes], ignore_index=True
+    ).reindex(columns=cubes[0].columns)
+    keys = [DIMENSION_COLUMN, *KEYS, *DIMENSIONS]
+
+    return (
+        apply_schema(cube)
+        .groupby(keys, dropna=False, observed=True, sort=False)
+        .agg({COUNT_COLUMN: "sum"})
+        .reset_index()
+    )
+
+
+def save_cube(cube: pd.DataFrame, dataset_file):
+    """
+    Saves the cube next to the dataset file.
+
+    The Arrow IPC cache of the dataset should be already saved, since the
+    cube records its fingerprint to detect when it becomes stale.
+    """
+    table = pa.Table.from_pandas(cube, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {
+            **(table.schema.metadata or {}),
+            **fingerprint(get_cache_file(dataset_file)),
+            b"cube_version": CUBE_VERSION.encode(),
+        }
+    )
+    write_table(table, get_cube_file(dataset_file))
+
+
+def load_cube(dataset_file) -> pd.DataFrame | None:
+    """
+    Loads the cube of the dataset, if it is up to date.
+    """
+    cube_file = get_cube_file(dataset_file)
+    cache_file = get_cache_file(dataset_file)
+    if not (cube_file.exists() and cache_file.exists()):
+        return None
+
+    reader = pa.ipc.open_file(pa.memory_map(str(cube_file)))
+    metadata = reader.schema.metadata or {}
+    if metadata.get(b"cube_version") != CUBE_VERSION.encode() or not is_fresh(
+        cache_file, metadata
+    ):
+        logger.info(f"{cube_file} is stale!")
+        return None
+
+    logger.info(f"Loading of the cube from {cube_file}...")
+    return reader.read_pandas()
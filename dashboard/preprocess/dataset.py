@@ -0,0 +1,257 @@
+import hashlib
+import logging
+import pathlib
+
+import pandas as pd
+import pyarrow as pa
+
+
+logger = logging.getLogger(__name__)
+
+
+__all__ = [
+    "get_cache_file",
+    "load_dataset",
+    "save_dataset",
+    "get_store_file",
+    "get_names_file",
+    "get_cube_file",
+    "get_model_file",
+    "load_rows",
+    "save_rows",
+    "apply_schema",
+]
+
+
+# Missing values, as written by `DataFrame.astype(str)`
+NA_VALUES = ["nan", "None", "NaT", "<NA>"]
+# Column of the row store holding the fingerprint of the raw row
+FINGERPRINT_COLUMN = "_fingerprint"
+
+
+def get_cache_file(dataset_file) -> pathlib.Path:
+    """
+    Returns the path of the Arrow IPC file which caches the dataset.
+    """
+    return pathlib.Path(dataset_file).with_suffix(".arrow")
+
+
+def get_store_file(dataset_file) -> pathlib.Path:
+    """
+    Returns the path of the Arrow IPC file which stores the cleaned rows.
+    """
+    path = pathlib.Path(dataset_file)
+
+    return path.with_name(f"{path.stem}.rows.arrow")
+
+
+def get_names_file(dataset_file) -> pathlib.Path:
+    """
+    Returns the path of the JSON file which keeps the cleaned names.
+    """
+    path = pathlib.Path(dataset_file)
+
+    return path.with_name(f"{path.stem}.names.json")
+
+
+def get_cube_file(dataset_file) -> pathlib.Path:
+    """
+    Returns the path of the Arrow IPC file which stores the aggregate cube.
+    """
+    path = pathlib.Path(dataset_file)
+
+    return path.with_name(f"{path.stem}.cube.arrow")
+
+
+def get_model_file(dataset_file) -> pathlib.Path:
+    """
+    Returns the path of the JSON file which stores the eligibility model of the API.
+    """
+    path = pathlib.Path(dataset_file)
+
+    return path.with_name(f"{path.stem}.model.json")
+
+
+def fingerprint(dataset_file) -> dict[bytes, bytes]:
+    path = pathlib.Path(dataset_file)
+
+    return {
+        b"source_mtime_ns": str(path.stat().st_mtime_ns).encode(),
+        b"source_sha256": hashlib.sha256(path.read_bytes()).hexdigest().encode(),
+    }
+
+
+def is_fresh(dataset_file, metadata: dict[bytes, bytes] | None) -> bool:
+    """
+    Whether the cache metadata match the current dataset file.
+    """
+    path = pathlib.Path(dataset_file)
+    metadata = metadata or {}
+
+    # Without the dataset, the cache is the only source available
+    if not path.exists():
+        return True
+
+    if metadata.get(b"source_mtime_ns") == str(path.stat().st_mtime_ns).encode():
+        return True
+
+    # The file has been touched, but its content can be the same
+    return metadata.get(b"source_sha256") == fingerprint(path)[b"source_sha256"]
+
+
+def normalize(dataframe: pd.DataFrame, empty_as_float: bool = True) -> pd.DataFrame:
+    """
+    Gives to the dataframe the same shape as when read back from Excel,
+    with typed columns instead of strings.
+    """
+    dataframe = dataframe.reset_index(drop=True)
+
+    # Duplicated names are renamed like in `pd.read_excel` (Age, Age.1, ...)
+    columns, seen = [], {}
+    for column in dataframe.columns:
+        count = seen.get(column, 0)
+        seen[column] = count + 1
+        columns.append(f"{column}.{count}" if count else column)
+    dataframe.columns = columns
+
+    objects = dataframe.select_dtypes("object").columns
+    dataframe[objects] = dataframe[objects].replace(NA_VALUES, None)
+    dataframe = dataframe.infer_objects()
+
+    # Empty columns are read as float from Excel
+    if empty_as_float:
+        empty = [x for x in objects if dataframe[x].isna().all()]
+        dataframe[empty] = dataframe[empty].astype(float)
+
+    return dataframe
+
+
+def write_table(table: pa.Table, file: pathlib.Path):
+    # Write then rename, so that a reader never sees a partial file
+    tmp_file = file.with_suffix(".arrow.tmp")
+    with pa.OSFile(str(tmp_file), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    tmp_file.replace(file)
+
+
+# Low-cardinality text columns, stored as categoricals
+CATEGORY_COLUMNS = [
+    "Niveau d'etude",
+    "Genre",
+    "Profession",
+    "Religion",
+    "Arrondissement de résidence",
+    "Health feedback analysis",
+]
+# Digitized (0/1) columns, apart from the health conditions
+DIGITIZED_COLUMNS = ["A-t-il (elle) déjà donné le sang", "ÉLIGIBILITÉ AU DON."]
+# Numeric columns with missing values, stored as nullable small integers
+SMALL_INT_COLUMNS = {"Age": "Int16", "Year": "Int16", "Month": "Int8"}
+
+
+def apply_schema(dataframe: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns the dataset with compact dtypes: categoricals for the
+    low-cardinality text columns, int8 for the digitized columns (the
+    health conditions included) and nullable small integers for the ages
+    and dates.
+    """
+    columns = dataframe.columns
+    dtypes = {x: "category" for x in CATEGORY_COLUMNS if x in columns}
+
+    digitized = [x for x in DIGITIZED_COLUMNS if x in columns]
+    # The health conditions are between these columns
+    if "ÉLIGIBILITÉ AU DON." in columns and "Si autres raison préciser" in columns:
+        start_column = columns.get_loc("ÉLIGIBILITÉ AU DON.")
+        end_column = columns.get_loc("Si autres raison préciser")
+        digitized += list(columns[start_column + 1 : end_column])
+    for column in digitized:
+        if pd.api.types.is_integer_dtype(dataframe[column]):
+            dtypes[column] = "int8"
+
+    dtypes |= {x: dtype for x, dtype in SMALL_INT_COLUMNS.items() if x in columns}
+
+    return dataframe.astype(dtypes)
+
+
+def save_dataset(dataframe: pd.DataFrame, dataset_file):
+    """
+    Saves the dataframe as an Arrow IPC file next to the dataset file.
+
+    The dataset file should be already saved, since the cache records its
+    modification time and content hash to detect when it becomes stale.
+    """
+    cache_file = get_cache_file(dataset_file)
+    table = pa.Table.from_pandas(normalize(dataframe), preserve_index=False)
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), **fingerprint(dataset_file)}
+    )
+    write_table(table, cache_file)
+
+
+def load_dataset(dataset_file) -> pd.DataFrame:
+    """
+    Loads the preprocessed dataset, from its Arrow IPC cache when it is
+    up to date, else from the Excel file (and then refresh the cache).
+    """
+    cache_file = get_cache_file(dataset_file)
+
+    if cache_file.exists():
+        # The cache is memory-mapped, so the columns which don't need a
+        # conversion are not copied.
+        reader = pa.ipc.open_file(pa.memory_map(str(cache_file)))
+
+        if is_fresh(dataset_file, reader.schema.metadata):
+            logger.info(f"Loading of the dataset from {cache_file}...")
+            return reader.read_pandas(split_blocks=True)
+
+        logger.info(f"{cache_file} is stale!")
+
+    logger.info(f"Loading of the dataset from {dataset_file}...")
+    dataframe = normalize(pd.read_excel(dataset_file, index_col=0))
+
+    try:
+        save_dataset(dataframe, dataset_file)
+    except (OSError, pa.ArrowException) as err:
+        logger.warning(f"Unable to cache the dataset: {err}")
+
+    return dataframe
+
+
+def save_rows(dataframe: pd.DataFrame, store_file, settings: dict[str, str]):
+    """
+    Saves the cleaned rows, with the fingerprint of their raw row in the
+    `FINGERPRINT_COLUMN` column, and the settings they were cleaned with.
+    """
+    table = pa.Table.from_pandas(dataframe, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {
+            **(table.schema.metadata or {}),
+            **{f"setting:{k}".encode(): v.encode() for k, v in settings.items()},
+        }
+    )
+    write_table(table, pathlib.Path(store_file))
+
+
+def load_rows(store_file, settings: dict[str, str]) -> pd.DataFrame | None:
+    """
+    Loads the cleaned rows, one per fingerprint, if they were cleaned with
+    the same settings.
+    """
+    store_file = pathlib.Path(store_file)
+    if not store_file.exists():
+        return None
+
+    reader = pa.ipc.open_file(pa.memory_map(str(store_file)))
+    metadata = reader.schema.metadata or {}
+    stored_settings = {
+        k.decode().removeprefix("setting:"): v.decode()
+        for k, v in metadata.items()
+        if k.startswith(b"setting:")
+    }
+    if stored_settings != settings:
+        logger.info(f"{store_file} was built with other settings!")
+        return None
+
+    return reader.read_pandas().drop_duplicates(FINGERPRINT_COLUMN)
@@ -0,0 +1,127 @@
+"""
+Eligibility model of the API: the number of eligible donors and of donors,
+overall and by genre, profession and age, with the known health conditions,
+genres and professions. It is all the prediction needs, so that the API
+doesn't load the dataset.
+
+Keep in sync with `api/model.py`, which loads it.
+"""
+
+import hashlib
+import json
+import logging
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+from .dataset import apply_schema, fingerprint, get_model_file
+
+
+logger = logging.getLogger(__name__)
+
+
+__all__ = ["build_model", "merge_models", "save_model"]
+
+
+# Version of the model file, to bump when its content changes
+MODEL_VERSION = "1"
+
+# Columns of the count tables
+COUNT_COLUMNS = ["Genre", "Profession", "Age"]
+
+
+def to_json(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def sort_table(table) -> list:
+    # The most frequent values first, in the same order whatever the parts
+    return sorted(table, key=lambda x: (-x[2], str(x[0])))
+
+
+def build_model(dataframe: pd.DataFrame) -> dict:
+    """
+    Returns the model of the dataset (or of a part of it, see `merge_models`).
+
+    Each count table is a list of [value, eligible count, count], by value
+    of its column (the missing values apart).
+    """
+    columns = dataframe.columns
+    start_column = columns.get_loc("ÉLIGIBILITÉ AU DON.")
+    end_column = columns.get_loc("Si autres raison préciser")
+
+    dataframe = apply_schema(dataframe[["Eligible", *COUNT_COLUMNS]])
+    eligible = dataframe[dataframe["Eligible"]]
+
+    counts = {}
+    for column in COUNT_COLUMNS:
+        eligible_counts = eligible[column].value_counts()
+        counts[column] = sort_table(
+            [to_json(value), int(eligible_counts.get(value, 0)), int(count)]
+            for value, count in dataframe[column].value_counts().items()
+            if count
+        )
+
+    return {
+        "eligible_count": int(eligible["Eligible"].count()),
+        "total_count": int(dataframe["Eligible"].count()),
+        "health_conditions": list(columns[start_column + 1 : end_column]),
+        "genres": [to_json(x) for x in dataframe["Genre"].dropna().unique()],
+        "professions": [to_json(x) for x in dataframe["Profession"].dropna().unique()],
+        "counts": counts,
+    }
+
+
+def merge_models(models: list[dict]) -> dict:
+    """
+    Returns the model of the whole dataset, from the models of its parts.
+    """
+    counts = {}
+    for column in COUNT_COLUMNS:
+        table = {}
+        for model in models:
+            for value, eligible_count, count in model["counts"][column]:
+                previous = table.get(value, (0, 0))
+                table[value] = (previous[0] + eligible_count, previous[1] + count)
+        counts[column] = sort_table([value, *table[value]] for value in table)
+
+    return {
+        "eligible_count": sum(x["eligible_count"] for x in models),
+        "total_count": sum(x["total_count"] for x in models),
+        "health_conditions": models[0]["health_conditions"],
+        # The values in the order where they appear first, as in the dataset
+        "genres": list(dict.fromkeys(x for model in models for x in model["genres"])),
+        "professions": list(
+            dict.fromkeys(x for model in models for x in model["professions"])
+        ),
+        "counts": counts,
+    }
+
+
+def dump_model(model: dict) -> bytes:
+    return json.dumps(model, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def save_model(model: dict, dataset_file):
+    """
+    Saves the model next to the dataset file.
+
+    The file starts with a header line (version, checksum of the model,
+    fingerprint of the dataset file), followed by the model in JSON.
+    """
+    data = dump_model(model)
+    header = {
+        "model_version": MODEL_VERSION,
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
+    # Like the Arrow cache, so that the model is built again when the dataset changes
+    if pathlib.Path(dataset_file).exists():
+        header |= {x.decode(): y.decode() for x, y in fingerprint(dataset_file).items()}
+
+    # Write then rename, so that the API never reads a partial file
+    model_file = get_model_file(dataset_file)
+    tmp_file = model_file.with_suffix(".tmp")
+    tmp_file.write_bytes(json.dumps(header).encode() + b"\n" + data)
+    tmp_file.replace(model_file)
+    logger.info(f"Model saved to {model_file} ({len(data)} bytes)")
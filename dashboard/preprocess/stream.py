@@ -0,0 +1,315 @@
+"""
+Streaming preprocessing: the rows go through the cleaning stages in chunks,
+so that the memory used does not depend on the size of the dataset.
+"""
+
+import logging
+import pathlib
+import shutil
+import tempfile
+from collections.abc import Iterable, Iterator
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+from openpyxl.cell.cell import ERROR_CODES
+from pandas.io.parsers import TextParser
+
+from .dataset import fingerprint, get_cache_file, normalize, write_table
+
+
+logger = logging.getLogger(__name__)
+
+
+__all__ = ["read_sheet", "iter_sheets", "write_dataset"]
+
+
+# Maximum number of rows of an Excel sheet (header included)
+EXCEL_MAX_ROWS = 1_048_576
+
+
+def read_sheet(
+    dataset_file, sheet: int, chunk_size: int, dtype=None
+) -> Iterator[pd.DataFrame]:
+    """
+    Reads a sheet of the workbook in chunks of rows, like `pd.read_excel`
+    would read each of them.
+    """
+    workbook = openpyxl.load_workbook(dataset_file, read_only=True, data_only=True)
+    try:
+        worksheet = workbook.worksheets[sheet]
+        worksheet.reset_dimensions()
+        rows = worksheet.iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        while header and header[-1] is None:
+            header.pop()
+        width = len(header)
+
+        chunk = []
+        for row in rows:
+            # Cells converted like in `pd.read_excel`, and empty rows skipped
+            row = [*row[:width], *[None] * (width - len(row))]
+            row = [
+                np.nan
+                if value in ERROR_CODES
+                else int(value)
+                if isinstance(value, float) and value == int(value)
+                else ""
+                if value is None
+                else value
+                for value in row
+            ]
+            if any(value != "" for value in row):
+                chunk.append(row)
+
+            if len(chunk) == chunk_size:
+                yield TextParser([header, *chunk], header=0, dtype=dtype).read()
+                chunk = []
+
+        if chunk:
+            yield TextParser([header, *chunk], header=0, dtype=dtype).read()
+    finally:
+        workbook.close()
+
+
+def get_kind(values: pd.Series) -> str:
+    if values.isna().all():
+        return "empty"
+    elif pd.api.types.is_bool_dtype(values):
+        return "bool"
+    elif pd.api.types.is_integer_dtype(values):
+        return "int"
+    elif pd.api.types.is_float_dtype(values):
+        return "float"
+    elif pd.api.types.is_datetime64_dtype(values):
+        return "datetime"
+
+    return "object"
+
+
+class ColumnPlan:
+    """
+    Type that a column would have once all the rows read (and concatenated),
+    which decides how its values are written as strings.
+    """
+
+    def __init__(self):
+        self.kinds = set()
+        self.has_na = False
+        # Resolution of the dates (as `DatetimeArray.astype(str)` shows them)
+        self.dates_only = True
+        self.milliseconds = False
+        self.microseconds = False
+
+    def update(self, values: pd.Series):
+        kind = get_kind(values)
+        self.has_na |= kind == "empty" or bool(values.isna().any())
+        if kind == "empty":
+            return
+
+        self.kinds.add(kind)
+        if kind == "datetime":
+            values = values.dropna()
+            self.dates_only &= bool((values == values.dt.normalize()).all())
+            self.milliseconds |= bool((values.dt.microsecond != 0).any())
+            self.microseconds |= bool((values.dt.microsecond % 1000 != 0).any())
+
+    def merge(self, plan: "ColumnPlan"):
+        """
+        Adds the column of another sheet, as `pd.concat` would.
+        """
+        self.has_na |= plan.has_na
+        # NB: The columns without value don't change the type
+        if plan.kinds:
+            self.kinds.add(plan.kind)
+        self.dates_only &= plan.dates_only
+        self.milliseconds |= plan.milliseconds
+        self.microseconds |= plan.microseconds
+
+    @property
+    def kind(self) -> str:
+        kinds = self.kinds
+        # The booleans along with numbers or missing values are read (and
+        # concatenated) as numbers
+        if kinds != {"bool"} or self.has_na:
+            kinds = {"int" if x == "bool" else x for x in kinds}
+
+        if not kinds or kinds <= {"int", "float"}:
+            return "int" if kinds == {"int"} and not self.has_na else "float"
+        elif len(kinds) == 1:
+            return next(iter(kinds))
+
+        return "object"
+
+    def convert(self, values: pd.Series) -> pd.Series:
+        kind = self.kind
+        if kind == "int":
+            return pd.to_numeric(values).astype("int64")
+        elif kind == "float":
+            return pd.to_numeric(values).astype(float)
+        elif kind == "bool":
+            return values.astype(bool)
+        elif kind == "datetime":
+            return pd.to_datetime(values)
+
+        return values
+
+    def format(self, values: pd.Series) -> pd.Series:
+        """
+        Returns the values as strings, like `astype(str)` on the whole column.
+        """
+        values = self.convert(values)
+        if self.kind != "datetime":
+            return values.astype(str)
+
+        if self.dates_only:
+            fmt, width = "%Y-%m-%d", None
+        elif self.microseconds or self.milliseconds:
+            fmt = "%Y-%m-%d %H:%M:%S.%f"
+            width = None if self.microseconds else -3
+        else:
+            fmt, width = "%Y-%m-%d %H:%M:%S", None
+
+        strings = values.dt.strftime(fmt).str[:width]
+        return strings.where(values.notna(), "NaT").astype(object)
+
+    def format_object(self, values: pd.Series) -> pd.Series:
+        """
+        Returns the values as strings, like `astype(str)` once concatenated
+        to the values of other types (each value being then a Python object).
+        """
+        values = self.convert(values)
+        if self.kind != "datetime":
+            return values.astype(str)
+
+        return values.astype(object).map(str)
+
+
+def iter_sheets(
+    dataset_file, chunk_size: int, sheets, prepare
+) -> Iterator[pd.DataFrame]:
+    """
+    Yields the rows of the sheets in chunks, with the same column names and
+    strings as `pd.concat(...).astype(str)` on the whole sheets.
+
+    The workbook is read twice: first to know the type of each column, as
+    `pd.read_excel` and `pd.concat` would infer it from all the rows.
+    """
+    sheet_plans = {}
+    for sheet in sheets:
+        plans = sheet_plans[sheet] = {}
+        for chunk in read_sheet(dataset_file, sheet, chunk_size):
+            chunk = prepare(sheet, chunk)
+            for column in chunk.columns:
+                plans.setdefault(column, ColumnPlan()).update(chunk[column])
+
+    plans = {}
+    for sheet in sheets:
+        for column, plan in sheet_plans[sheet].items():
+            plans.setdefault(column, ColumnPlan()).merge(plan)
+    # The columns missing from a sheet are filled with NaN
+    for column, plan in plans.items():
+        plan.has_na |= any(column not in sheet_plans[x] for x in sheets)
+
+    columns = list(plans)
+    for sheet in sheets:
+        for chunk in read_sheet(dataset_file, sheet, chunk_size, dtype=object):
+            chunk = prepare(sheet, chunk).reindex(columns=columns)
+            data = {}
+            for column in columns:
+                if plans[column].kind != "object":
+                    data[column] = plans[column].format(chunk[column])
+                elif column in sheet_plans[sheet]:
+                    plan = sheet_plans[sheet][column]
+                    data[column] = plan.format_object(chunk[column])
+                else:
+                    data[column] = chunk[column].astype(str)
+            yield pd.DataFrame(data)
+
+
+def write_dataset(
+    chunks: Iterable[pd.DataFrame], pre_dataset_file, excel: bool = True
+) -> int:
+    """
+    Saves the cleaned chunks like `dataset.save_dataset`, as the Excel file
+    and its Arrow IPC cache, and returns the number of rows.
+
+    Each chunk is kept in a temporary Arrow file, until the schema of all
+    the chunks is known. Without the Excel file (or when there are too many
+    rows for it), the Arrow file is the only copy of the dataset.
+    """
+    pre_dataset_file = pathlib.Path(pre_dataset_file)
+    tmp_dir = pathlib.Path(tempfile.mkdtemp(dir=pre_dataset_file.parent))
+    try:
+        files, schemas, rows = [], [], 0
+        for chunk in chunks:
+            table = pa.Table.from_pandas(
+                normalize(chunk, empty_as_float=False), preserve_index=False
+            ).replace_schema_metadata()
+            files.append(tmp_dir / f"{len(files)}.arrow")
+            schemas.append(table.schema)
+            write_table(table, files[-1])
+            rows += table.num_rows
+
+        schema = unify_schemas(schemas)
+
+        pre_dataset_file.unlink(missing_ok=True)
+        if excel and rows >= EXCEL_MAX_ROWS:
+            logger.warning(f"Too many rows for {pre_dataset_file}, not saved!")
+        elif excel:
+            write_excel(files, schema, pre_dataset_file)
+
+        table_metadata = {}
+        if pre_dataset_file.exists():
+            table_metadata = fingerprint(pre_dataset_file)
+
+        # Write then rename, so that a reader never sees a partial file
+        cache_file = get_cache_file(pre_dataset_file)
+        tmp_file = cache_file.with_suffix(".arrow.tmp")
+        with pa.OSFile(str(tmp_file), "wb") as sink:
+            with pa.ipc.new_file(sink, schema.with_metadata(table_metadata)) as writer:
+                for file in files:
+                    writer.write_table(read_table(file, schema))
+        tmp_file.replace(cache_file)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    return rows
+
+
+def unify_schemas(schemas: list[pa.Schema]) -> pa.Schema:
+    """
+    Returns the schema of the whole dataset, as `normalize` would type it.
+    """
+    schema = pa.unify_schemas(schemas, promote_options="permissive")
+
+    # Empty columns are read as float from Excel
+    fields = [
+        field.with_type(pa.float64()) if pa.types.is_null(field.type) else field
+        for field in schema
+    ]
+
+    return pa.schema(fields)
+
+
+def read_table(file: pathlib.Path, schema: pa.Schema) -> pa.Table:
+    return pa.ipc.open_file(pa.memory_map(str(file))).read_all().cast(schema)
+
+
+def write_excel(files: list[pathlib.Path], schema: pa.Schema, pre_dataset_file):
+    """
+    Writes the chunks as `DataFrame.to_excel` would write the whole dataset.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Sheet1")
+    worksheet.append([None, *schema.names])
+
+    index = 0
+    for file in files:
+        dataframe = read_table(file, schema).to_pandas()
+        for row in dataframe.astype(object).itertuples(index=False):
+            worksheet.append([index, *(None if pd.isna(x) else x for x in row)])
+            index += 1
+
+    workbook.save(pre_dataset_file)
@@ -1,16 +1,43 @@
+import json
+import pathlib
 import re
 import unicodedata
 from datetime import datetime
 import difflib
 
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
+import numpy as np
+import pandas as pd
 
-# Download necessary NLTK data files
-nltk.download("punkt")
-nltk.download("stopwords")
-nltk.download("punkt_tab")
+# NLTK resources needed by the sentiment analysis, with their package
+NLTK_RESOURCES = {
+    "corpora/stopwords": "stopwords",
+    "tokenizers/punkt_tab": "punkt_tab",
+}
+
+
+def load_nltk(data_dir=None):
+    """
+    Imports NLTK and makes sure that its resources are available.
+
+    The resources are looked for locally first, in data_dir and in the NLTK
+    data paths (see NLTK_DATA). Only the missing ones are downloaded, into
+    data_dir.
+
+    NB: NLTK is slow to import, that's why it's only imported when needed.
+    """
+    import nltk
+
+    if data_dir and str(data_dir) not in nltk.data.path:
+        nltk.data.path.insert(0, str(data_dir))
+
+    for resource, package in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            if not nltk.download(package, download_dir=data_dir, quiet=True):
+                raise LookupError(f"Unable to download the NLTK {package!r} data")
+
+    return nltk
 
 
 def remove_diacritics(value: str) -> str:
@@ -34,94 +61,307 @@ def clean_name(value: str) -> str:
     return re.sub(r"\(.*", "", value).strip()
 
 
-def clean_date(value: str) -> str:
-    re_year = r"[12]\d{3}"
-    re_month = r"0?[1-9]|1[0-2]"
-    re_day = r"0?[1-9]|[1-2][0-9]|3[0-1]"
+class NameCleaner:
+    """
+    Cleans the names (see `clean_name`) of the distinct values only.
 
-    # 2024-02-01, 2023/08/04
-    re_date_1 = (
-        rf"(?P<years>{re_year})(/|-)(?P<months>({re_month}))\2(?P<days>({re_day}))"
-    )
-    # 01-02-2024, 04/08/2023
-    re_date_2 = (
-        rf"(?P<days>{re_day})(/|-)(?P<months>({re_month}))\2(?P<years>{re_year})"
-    )
+    The cleaned names are kept in a dictionary, which can be saved to be
+    reused by the next runs.
+    """
+
+    # Version of `clean_name`, to bump when it gives other names
+    version = 1
+
+    def __init__(self, names: dict[str, str] | None = None):
+        # Value -> cleaned name
+        self.names = dict(names or {})
+
+    @classmethod
+    def load(cls, file) -> "NameCleaner":
+        """
+        Loads the dictionary, if saved by the same version.
+        """
+        try:
+            data = json.loads(pathlib.Path(file).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return cls()
+
+        if data.get("version") != cls.version:
+            return cls()
+
+        return cls(data["names"])
 
-    for i in [
-        re_date_1,
-        re_date_2,
-    ]:
-        # is date?
-        data = re.match(i, value)
-        if not data:
-            continue
+    def save(self, file):
+        data = {"version": self.version, "names": self.names}
 
-        data = data.groupdict()
+        # Write then rename, so that a reader never sees a partial file
+        tmp_file = pathlib.Path(file).with_suffix(".tmp")
+        tmp_file.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        tmp_file.replace(file)
 
-        date = "{years}-{months:0>2}-{days:0>2}".format(**data)
+    def clean(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+        """
+        Returns the cleaned names of each column.
+        """
+        return dataframe.apply(self.clean_column)
 
-        return date
+    def clean_column(self, values: pd.Series) -> pd.Series:
+        codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        names = self.names
+        for value in uniques:
+            if value not in names:
+                names[value] = clean_name(value)
 
-    return None
+        return pd.Series(
+            np.array([names[value] for value in uniques], dtype=object)[codes],
+            index=values.index,
+        )
 
 
-def calculate_age(birthdate):
-    today = datetime.today()
+RE_YEAR = r"[12]\d{3}"
+RE_MONTH = r"0?[1-9]|1[0-2]"
+RE_DAY = r"0?[1-9]|[1-2][0-9]|3[0-1]"
 
-    return (
-        today.year
-        - birthdate.year
-        - ((today.month, today.day) < (birthdate.month, birthdate.day))
+# Recognized date layouts, with their format for `pd.to_datetime`.
+DATE_LAYOUTS = {
+    # 2024-02-01
+    "ymd": (rf"{RE_YEAR}-(?:{RE_MONTH})-(?:{RE_DAY})", "%Y-%m-%d"),
+    # 2023/08/04
+    "ymd_slash": (rf"{RE_YEAR}/(?:{RE_MONTH})/(?:{RE_DAY})", "%Y/%m/%d"),
+    # 01-02-2024
+    "dmy": (rf"(?:{RE_DAY})-(?:{RE_MONTH})-{RE_YEAR}", "%d-%m-%Y"),
+    # 08/04/2023
+    "mdy_slash": (rf"(?:{RE_MONTH})/(?:{RE_DAY})/{RE_YEAR}", "%m/%d/%Y"),
+}
+# The date should start the value (eg. "2024-02-01 00:00:00"), and the
+# first recognized layout wins.
+RE_DATE = re.compile(
+    "^(?:"
+    + "|".join(f"(?P<{name}>{regex})" for name, (regex, _) in DATE_LAYOUTS.items())
+    + r")(?!\d)"
+)
+
+
+def clean_dates(values: pd.Series) -> pd.Series:
+    """
+    Converts the values to dates, using the first recognized layout.
+
+    Unrecognized or invalid dates are converted to NaT.
+    """
+    # Dates are repeated a lot, so we only parse the distinct values.
+    codes, uniques = pd.factorize(values.astype(str))
+    layouts = pd.Series(uniques).str.extract(RE_DATE)
+    dates = pd.Series(pd.NaT, index=layouts.index, dtype="datetime64[ns]")
+
+    for name, (_, date_format) in DATE_LAYOUTS.items():
+        matches = layouts[name].dropna()
+        dates[matches.index] = pd.to_datetime(
+            matches, format=date_format, errors="coerce"
+        )
+
+    return pd.Series(dates.to_numpy()[codes], index=values.index)
+
+
+def calculate_ages(birthdates: pd.Series, reference_date=None) -> pd.Series:
+    """
+    Returns the age at the reference date (today by default).
+    """
+    reference_date = pd.Timestamp(reference_date or datetime.today())
+    # Whether the birthday is not yet passed in the reference year
+    before_birthday = (birthdates.dt.month > reference_date.month) | (
+        (birthdates.dt.month == reference_date.month)
+        & (birthdates.dt.day > reference_date.day)
     )
 
+    return reference_date.year - birthdates.dt.year - before_birthday
+
+
+def trigrams(value: str) -> set[str]:
+    value = f"  {value} "
+
+    return {value[i : i + 3] for i in range(len(value) - 2)}
+
+
+class ArrondissementMatcher:
+    """
+    Fuzzy matcher of the arrondissement names, built once from the
+    reference names (eg. the ADM3_FR of the GeoJSON features).
+
+    Names are compared in lowercase and without diacritics. Only the
+    reference names sharing a trigram with the value are scored with
+    `difflib.SequenceMatcher`, and the best one is kept if its ratio
+    reaches the cutoff. Each distinct value is matched only once.
+    """
 
-# Return the most similar in the list
-def fix_arrondissement(value: str, possible_arrs: list[str]) -> str | None:
-    if not value or value == "nan":
-        return None
+    def __init__(self, names: list[str], cutoff: float = 0.5):
+        self.cutoff = cutoff
+        # Normalized name -> reference name
+        self.names = {}
+        for name in names:
+            self.names.setdefault(self.normalize(name), name)
 
-    # use the cutoff parameter for more precision
-    return ([None] + difflib.get_close_matches(value, possible_arrs))[-1]
+        # Trigram -> normalized names
+        self.index = {}
+        for key in self.names:
+            for trigram in trigrams(key):
+                self.index.setdefault(trigram, set()).add(key)
 
+        # Value -> (reference name, score)
+        self.matches = {}
+
+    @staticmethod
+    def normalize(value: str) -> str:
+        return remove_diacritics(value).lower().strip()
+
+    def match_one(self, value: str) -> tuple[str | None, float]:
+        """
+        Returns the most similar reference name and its score.
+        """
+        if not value or value == "nan":
+            return None, 0.0
+
+        if value not in self.matches:
+            key = self.normalize(value)
+            candidates = set().union(
+                *(self.index.get(trigram, ()) for trigram in trigrams(key))
+            )
+
+            best, best_score = None, self.cutoff
+            matcher = difflib.SequenceMatcher(b=key)
+            # Sorted, so that ties are broken in the same way at each run
+            for candidate in sorted(candidates):
+                matcher.set_seq1(candidate)
+                # Cheap upper bounds first, like `difflib.get_close_matches`
+                if (
+                    matcher.real_quick_ratio() >= best_score
+                    and matcher.quick_ratio() >= best_score
+                ):
+                    score = matcher.ratio()
+                    if score >= best_score:
+                        best, best_score = candidate, score
+
+            self.matches[value] = (
+                (self.names[best], best_score) if best else (None, 0.0)
+            )
+
+        return self.matches[value]
+
+    def match(self, values: pd.Series) -> pd.DataFrame:
+        """
+        Returns the most similar reference name and its score for each value.
+        """
+        codes, uniques = pd.factorize(values.fillna(""))
+        matches = pd.DataFrame(
+            [self.match_one(value) for value in uniques], columns=["match", "score"]
+        )
+
+        return matches.iloc[codes].set_axis(values.index)
+
+    def audit(self) -> pd.DataFrame:
+        """
+        Returns the matched values with their score, the worst first.
+        """
+        return pd.DataFrame(
+            [(value, *match) for value, match in self.matches.items()],
+            columns=["value", "match", "score"],
+        ).sort_values("score")
+
+
+def compact_geodata(gdf, names, tolerance: float = 0.0005, precision: int = 5):
+    """
+    Returns the arrondissements of the given names only, with their geometry
+    simplified to the tolerance (in degrees) and snapped to a grid of the
+    given number of decimals.
+    """
+    gdf = gdf.loc[gdf["ADM3_FR"].isin(names), ["ADM3_FR", "geometry"]]
+    geometry = gdf.geometry.simplify(tolerance, preserve_topology=True)
+
+    return gdf.set_geometry(geometry.set_precision(10**-precision))
+
+
+class SentimentAnalyzer:
+    """
+    Lexicon based sentiment analysis, giving Positive, Neutral or Negative.
+
+    The resources are loaded once (see `load_nltk`), and each distinct
+    expression is only analyzed once.
+    """
 
-def sentiment_analysis(expression):
     # Basic French sentiment lexicon
-    french_lexicon = {
+    lexicon = {
         "pas": "positive",
         "aucune": "positive",
         "rien": "positive",
         "nan": "neutral",
     }
 
-    # Load French stopwords
-    stop_words = set(stopwords.words("french"))
-
-    # Tokenize the sentence
-    words = word_tokenize(expression, language="french")
-
-    # Remove stopwords
-    filtered_words = [
-        word.lower()
-        for word in words
-        if word.isalnum() and word.lower() not in stop_words
-    ]
-
-    # Calculate sentiment score
-    sentiment_score = 0
-    for word in filtered_words:
-        if word in french_lexicon:
-            if french_lexicon[word] == "positive":
-                sentiment_score += 2
-            elif french_lexicon[word] == "neutral":
-                continue
+    def __init__(self, language: str = "french", data_dir=None):
+        nltk = load_nltk(data_dir)
+
+        self.language = language
+        self.data_dir = data_dir
+        self.tokenize = nltk.tokenize.word_tokenize
+        # Load the stopwords
+        self.stop_words = set(nltk.corpus.stopwords.words(language))
+        # Expression -> sentiment
+        self.sentiments = {}
+
+    def __getstate__(self):
+        # The results are not needed by the worker processes
+        return {**self.__dict__, "sentiments": {}}
+
+    def __setstate__(self, state):
+        # In a spawned worker process, NLTK has to find its data again
+        self.__dict__.update(state)
+        load_nltk(self.data_dir)
+
+    def analyze(self, expression: str) -> str:
+        # Tokenize the sentence
+        words = self.tokenize(expression, language=self.language)
+
+        # Remove stopwords
+        filtered_words = [
+            word.lower()
+            for word in words
+            if word.isalnum() and word.lower() not in self.stop_words
+        ]
+
+        # Calculate sentiment score
+        sentiment_score = 0
+        for word in filtered_words:
+            if word in self.lexicon:
+                if self.lexicon[word] == "positive":
+                    sentiment_score += 2
+                elif self.lexicon[word] == "neutral":
+                    continue
+            else:
+                sentiment_score -= 1
+
+        # Determine overall sentiment
+        if sentiment_score > 0:
+            return "Positive"
+        elif sentiment_score < 0:
+            return "Negative"
         else:
-            sentiment_score -= 1
-
-    # Determine overall sentiment
-    if sentiment_score > 0:
-        return "Positive"
-    elif sentiment_score < 0:
-        return "Negative"
-    else:
-        return "Neutral"
+            return "Neutral"
+
+    def analyze_all(self, expressions: pd.Series) -> pd.Series:
+        """
+        Analyzes each expression of the series.
+
+        The results are kept for the next calls (eg. the next chunks of the
+        dataset). NB: With several workers, the chunks are analyzed in
+        parallel (see `preprocess.clean_chunks`).
+        """
+        codes, uniques = pd.factorize(expressions)
+        todo = [
+            expression for expression in uniques if expression not in self.sentiments
+        ]
+
+        sentiments = [self.analyze(expression) for expression in todo]
+        self.sentiments.update(zip(todo, sentiments))
+
+        sentiments = [self.sentiments[expression] for expression in uniques]
+        return pd.Series(
+            np.array(sentiments, dtype=object)[codes], index=expressions.index
+        )
@@ -0,0 +1,153 @@
+import json
+import time
+
+import pytest
+import requests
+
+from dashboard.client import CircuitOpenError, PredictionClient
+
+
+def make_response(status_code: int, body=None, headers=None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = "http://api/"
+    response._content = b"" if body is None else json.dumps(body).encode()
+    response.headers.update(headers or {})
+
+    return response
+
+
+class StubSession:
+    """
+    Answers the requests with the given responses (or exceptions), in order.
+    """
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+
+        return answer
+
+
+def make_client(*answers, **kwargs) -> PredictionClient:
+    client = PredictionClient("http://api", **kwargs)
+    client.session = StubSession(*answers)
+
+    return client
+
+
+def test_breaker_opens_after_failures():
+    client = make_client(
+        *[requests.ConnectionError()] * 3, max_failures=3, reset_timeout=60
+    )
+
+    for _ in range(3):
+        with pytest.raises(requests.ConnectionError):
+            client.predict({})
+
+    # The API is not called anymore
+    with pytest.raises(CircuitOpenError):
+        client.predict({})
+    assert len(client.session.calls) == 3
+    assert client.stats()["circuit"] == "open"
+    assert client.stats()["rejected"] == 1
+
+
+def test_breaker_half_open_then_closes():
+    client = make_client(
+        *[requests.ConnectionError()] * 2,
+        make_response(200, {"score": 0.5}),
+        make_response(200, {"score": 0.7}),
+        max_failures=2,
+        reset_timeout=0.05,
+    )
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            client.predict({})
+    with pytest.raises(CircuitOpenError):
+        client.predict({})
+
+    time.sleep(0.06)
+    # A single call checks whether the API is back, then it is closed
+    assert client.predict({}) == {"score": 0.5}
+    assert client.stats()["circuit"] == "closed"
+    assert client.predict({}) == {"score": 0.7}
+    assert len(client.session.calls) == 4
+
+
+def test_breaker_half_open_fails_again():
+    client = make_client(
+        *[requests.ConnectionError()] * 3, max_failures=2, reset_timeout=0.05
+    )
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            client.predict({})
+
+    time.sleep(0.06)
+    with pytest.raises(requests.ConnectionError):
+        client.predict({})
+    # Open again, for another reset timeout
+    with pytest.raises(CircuitOpenError):
+        client.predict({})
+    assert len(client.session.calls) == 3
+
+
+def test_refused_requests_dont_open_the_breaker():
+    client = make_client(
+        *[make_response(422, {"detail": "invalid"})] * 3,
+        make_response(200, {"score": 1.0}),
+        max_failures=2,
+    )
+    for _ in range(3):
+        with pytest.raises(requests.HTTPError):
+            client.predict({})
+
+    assert client.predict({}) == {"score": 1.0}
+    assert client.stats()["errors"] == 3
+
+
+def test_entries_revalidated_with_etag():
+    entries = {"health_conditions": ["a"], "professions": [], "genres": []}
+    client = make_client(
+        make_response(200, entries, {"ETag": '"v1"'}),
+        make_response(304, headers={"ETag": '"v1"'}),
+        entries_ttl=0,
+    )
+
+    assert client.entries() == entries
+    assert client.entries() == entries
+    # The second call sent the ETag, and was answered without the entries
+    assert "If-None-Match" not in client.session.calls[0][2]["headers"]
+    assert client.session.calls[1][2]["headers"] == {"If-None-Match": '"v1"'}
+    assert client.stats()["entries_revalidated"] == 1
+
+
+def test_entries_kept_during_ttl_and_served_on_error():
+    entries = {"health_conditions": [], "professions": ["x"], "genres": []}
+    client = make_client(
+        make_response(200, entries, {"ETag": '"v1"'}),
+        requests.ConnectionError(),
+        entries_ttl=60,
+    )
+
+    assert client.entries() == entries
+    assert client.entries() == entries
+    assert len(client.session.calls) == 1
+
+    # Outdated entries are better than none
+    client.entries_ttl = 0
+    assert client.entries() == entries
+    assert client.stats()["entries_hits"] == 2
+
+
+def test_entries_raise_without_cache():
+    client = make_client(requests.ConnectionError())
+
+    with pytest.raises(requests.ConnectionError):
+        client.entries()
@@ -0,0 +1,32 @@
+import pytest
+
+from dashboard.jobs import JobQueue
+
+
+def fail():
+    raise ValueError("failed")
+
+
+@pytest.fixture
+def jobs():
+    return JobQueue(workers=1)
+
+
+def test_submit_shares_the_job(jobs):
+    future = jobs.submit("key", sum, [1, 2])
+
+    assert jobs.submit("key", sum, [1, 2]) is future
+    assert future.result() == 3
+    assert jobs.stats()["shared"] == 1
+
+
+def test_get_does_not_resubmit(jobs):
+    future = jobs.submit("key", fail)
+    with pytest.raises(ValueError):
+        future.result()
+
+    # The failed job stays visible, until it is submitted again
+    assert jobs.get("key") is future
+    assert jobs.stats()["submitted"] == 1
+    assert jobs.submit("key", fail) is not future
+    assert jobs.get("unknown") is None
@@ -0,0 +1,82 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from dashboard import profiling
+from dashboard.profiling import ProfileStore
+
+
+class SlowFit:
+    """
+    Replaces the fit by one waiting until released, and keeps the fitted
+    profiles.
+    """
+
+    def __init__(self):
+        self.fitted = []
+        self.released = threading.Event()
+
+    def __call__(self, df, paired_with, minibatch_size):
+        self.fitted.append(paired_with)
+        assert self.released.wait(5)
+
+        return {"paired_with": paired_with}
+
+    def wait_fits(self, count: int):
+        deadline = time.monotonic() + 5
+        while len(self.fitted) < count:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+
+@pytest.fixture
+def fit(monkeypatch):
+    fit = SlowFit()
+    monkeypatch.setattr(profiling, "fit_profile", fit)
+
+    return fit
+
+
+def get_or_fit(store, paired_with):
+    return store.get_or_fit("v1", paired_with, lambda: None)
+
+
+def test_profile_fitted_once(fit):
+    store = ProfileStore()
+    with ThreadPoolExecutor(4) as executor:
+        futures = [executor.submit(get_or_fit, store, "Religion") for _ in range(4)]
+        fit.wait_fits(1)
+        fit.released.set()
+
+    assert [x.result() for x in futures] == [{"paired_with": "Religion"}] * 4
+    assert fit.fitted == ["Religion"]
+
+
+def test_profiles_fitted_in_parallel(fit):
+    store = ProfileStore()
+    with ThreadPoolExecutor(2) as executor:
+        futures = [
+            executor.submit(get_or_fit, store, paired_with)
+            for paired_with in ["Religion", "Profession"]
+        ]
+        # Both fits run at once
+        fit.wait_fits(2)
+        fit.released.set()
+
+    assert [x.result()["paired_with"] for x in futures] == ["Religion", "Profession"]
+
+
+def test_fitted_profile_not_blocked_by_a_fit(fit):
+    store = ProfileStore()
+    fit.released.set()
+    profile = get_or_fit(store, "Profession")
+    fit.released.clear()
+
+    with ThreadPoolExecutor(1) as executor:
+        religion = executor.submit(get_or_fit, store, "Religion")
+        fit.wait_fits(2)
+        assert get_or_fit(store, "Profession") is profile
+        assert not religion.done()
+        fit.released.set()
@@ -0,0 +1,148 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from preprocess.stream import ColumnPlan, iter_sheets
+
+
+SHEETS = [0, 1]
+
+
+def write_workbook(path, dataframes: list[pd.DataFrame]):
+    with pd.ExcelWriter(path) as writer:
+        for i, dataframe in enumerate(dataframes):
+            dataframe.to_excel(writer, sheet_name=f"Sheet{i}", index=False)
+
+
+def read_whole(path) -> pd.DataFrame:
+    # As the preprocessing reads the sheets without streaming
+    dataframes = [pd.read_excel(path, sheet_name=sheet) for sheet in SHEETS]
+
+    return pd.concat(dataframes).astype(str).reset_index(drop=True)
+
+
+def read_streamed(path, chunk_size: int) -> pd.DataFrame:
+    chunks = iter_sheets(path, chunk_size, SHEETS, lambda sheet, chunk: chunk)
+
+    return pd.concat(chunks).reset_index(drop=True)
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / "dataset.xlsx"
+    write_workbook(
+        path,
+        [
+            pd.DataFrame(
+                {
+                    # Numbers, then text in the next sheet
+                    "mixed": [1, 2, 3, 4],
+                    # Numbers, with a missing value in the last chunk
+                    "int_na": [1, 2, 3, None],
+                    "int_float": [1, 2, 3, 4],
+                    # Values in the next sheet only
+                    "empty": [None] * 4,
+                    "dates": pd.to_datetime(["2020-01-01", None, "2020-03-01", None]),
+                    "bools": [True, False, True, False],
+                }
+            ),
+            pd.DataFrame(
+                {
+                    "mixed": ["a", "b", 5, None],
+                    "int_na": [5, 6, 7, 8],
+                    "int_float": [1.5, 2, 3, 4],
+                    "empty": ["x", None, "y", None],
+                    "dates": [
+                        datetime.datetime(2021, 1, 1, 10, 30),
+                        datetime.datetime(2021, 1, 2),
+                        None,
+                        datetime.datetime(2021, 1, 3, 0, 0, 1),
+                    ],
+                    "bools": [True, None, False, True],
+                    # Missing from the previous sheet
+                    "missing": [1, 2, 3, 4],
+                }
+            ),
+        ],
+    )
+
+    return path
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 100])
+def test_iter_sheets(workbook, chunk_size):
+    pd.testing.assert_frame_equal(
+        read_streamed(workbook, chunk_size), read_whole(workbook)
+    )
+
+
+@pytest.mark.parametrize(
+    "chunks, kind",
+    [
+        ([[1, 2], [3]], "int"),
+        ([[1, 2], [None]], "float"),
+        ([[1, 2], [1.5]], "float"),
+        ([[1, 2], ["a"]], "object"),
+        ([[None], [None]], "float"),
+        ([[True], [False]], "bool"),
+        # The booleans along with numbers or missing values are numbers
+        ([[True], [None]], "float"),
+        ([[True], [2]], "int"),
+        ([[True], ["a"]], "object"),
+        ([[pd.Timestamp("2020-01-01")], [None]], "datetime"),
+        ([[pd.Timestamp("2020-01-01")], [1]], "object"),
+    ],
+)
+def test_column_plan_kind(chunks, kind):
+    plan = ColumnPlan()
+    for values in chunks:
+        series = pd.Series(values)
+        # As read from Excel: the missing values alone give an empty column
+        if series.isna().all():
+            series = series.astype(float)
+        plan.update(series.infer_objects())
+
+    assert plan.kind == kind
+
+
+def test_column_plan_merge():
+    plans = []
+    for values in [[1, 2], [None], ["a"]]:
+        plan = ColumnPlan()
+        plan.update(pd.Series(values).infer_objects())
+        plans.append(plan)
+
+    merged = ColumnPlan()
+    for plan in plans[:2]:
+        merged.merge(plan)
+    # The empty sheet only adds missing values
+    assert merged.kind == "float"
+
+    merged.merge(plans[2])
+    assert merged.kind == "object"
+
+
+@pytest.mark.parametrize(
+    "values, expected",
+    [
+        (["2020-01-01", "2020-01-02"], ["2020-01-01", "2020-01-02"]),
+        (
+            ["2020-01-01", "2020-01-02 10:30"],
+            ["2020-01-01 00:00:00", "2020-01-02 10:30:00"],
+        ),
+        (
+            ["2020-01-01", "2020-01-02 00:00:00.5"],
+            ["2020-01-01 00:00:00.000", "2020-01-02 00:00:00.500"],
+        ),
+        (["2020-01-01", None], ["2020-01-01", "NaT"]),
+    ],
+)
+def test_column_plan_format_dates(values, expected):
+    values = pd.Series(pd.to_datetime(values, format="ISO8601"))
+    plan = ColumnPlan()
+    plan.update(values)
+
+    assert plan.format(values).tolist() == expected
+    # As `astype(str)` on the whole column
+    assert values.astype(str).tolist() == expected